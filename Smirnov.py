@@ -1,71 +1,995 @@
 import sys
+import math
+import mmap  # Файлы подкачки плиток, отображенные в память
+import tempfile  # Файлы подкачки создаются во временной папке
+import zlib  # Сжатие старых шагов истории
+from bisect import bisect_left, bisect_right  # Поиск отрезков в отсортированных списках
+from collections import OrderedDict  # Кэш сведенных плиток с вытеснением давно не показанных
+
+import numpy as np  # Быстрые операции над пикселями изображения
 
 # Импорт нужных классов из PyQt6
-from PyQt6.QtCore import QSize, Qt  # Размеры, флаги выравнивания
-from PyQt6.QtGui import QIcon, QAction, QColor, QPixmap, QPainter  # Иконки, цвета, изображение, рисование
+from PyQt6 import sip  # Указатель на память плитки для QImage
+from PyQt6.QtCore import (  # Размеры, флаги, точки, прямоугольники, таймер, фоновые задачи
+  QSize, Qt, QPointF, QRect, QRectF, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
+)
+from PyQt6.QtGui import (  # Иконки, цвета, изображения, чтение файлов, рисование
+  QIcon, QAction, QColor, QPixmap, QImage, QImageReader, QImageIOHandler, QPainter, QPainterPath, QPen,
+  QKeySequence, qPremultiply, qUnpremultiply
+)
 from PyQt6.QtWidgets import (  # Виджеты интерфейса
-  QApplication, QMainWindow, QLabel,
-  QGraphicsColorizeEffect, QToolBar, QSlider, QPushButton, QColorDialog
+  QApplication, QMainWindow, QLabel, QWidget, QButtonGroup, QSpinBox, QComboBox, QCheckBox,
+  QToolBar, QSlider, QPushButton, QColorDialog, QFileDialog, QInputDialog, QMessageBox
 )
 
 
-# Класс холста, где мы будем рисовать
-class Canvas(QLabel):
-    def __init__(self):
+# Заливка области, связанной с точкой (x, y), по строкам-отрезкам.
+# pixels — массив uint32 (высота x ширина) поверх пикселей изображения, меняется на месте.
+# Возвращает (x0, y0, x1, y1) залитой области или None, если заливать нечего
+def flood_fill(pixels, x, y, color, tolerance=0):
+    seed = pixels[y, x]
+    if seed == color:
+        return None
+    mask, bounds = flood_mask(pixels, [(x, y)], seed, color, tolerance)
+    pixels[mask] = color
+    return bounds
+
+
+# Маска области, связанной с точками seeds и похожей на цвет target, и ее границы (x0, y0, x1, y1).
+# Точки, уже залитые цветом color или непохожие на target, пропускаются; None — заливать нечего
+def flood_mask(pixels, seeds, target, color, tolerance=0):
+    height, width = pixels.shape
+
+    # Маска похожих пикселей считается сразу для всего изображения
+    if tolerance:
+        # Каждый канал сравнивается с диапазоном прямо в uint8, без перевода в большие числа
+        channels = pixels.view(np.uint8).reshape(height, width, 4)
+        similar = np.ones((height, width), dtype=bool)
+        for channel, value in enumerate(np.array([target], dtype=np.uint32).view(np.uint8).tolist()):
+            plane = channels[:, :, channel]
+            similar &= (plane >= max(0, value - tolerance)) & (plane <= min(255, value + tolerance))
+    else:
+        similar = pixels == target
+
+    # Отрезки подряд идущих похожих пикселей в каждой строке: начало (включительно) и конец (не включительно)
+    edges = np.diff(np.pad(similar, ((0, 0), (1, 1))).view(np.int8), axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    run_ends = np.nonzero(edges == -1)[1]
+    # Отрезки строки y лежат в списках с индексами от row_start[y] до row_start[y + 1]
+    row_start = np.searchsorted(run_rows, np.arange(height + 1)).tolist()
+    run_rows, run_starts, run_ends = run_rows.tolist(), run_starts.tolist(), run_ends.tolist()
+
+    # Находим отрезки, в которых лежат начальные точки
+    visited = bytearray(len(run_starts))
+    stack = []
+    for x, y in seeds:
+        if pixels[y, x] == color or not similar[y, x]:
+            continue
+        first = bisect_right(run_starts, x, row_start[y], row_start[y + 1]) - 1
+        if not visited[first]:
+            visited[first] = 1
+            stack.append(first)
+    if not stack:
+        return None
+    filled = []
+    # Обход в ширину по отрезкам: соседи — отрезки строк выше и ниже, перекрывающие текущий
+    while stack:
+        run = stack.pop()
+        filled.append(run)
+        row, start, end = run_rows[run], run_starts[run], run_ends[run]
+        for near in (row - 1, row + 1):
+            if 0 <= near < height:
+                lo, hi = row_start[near], row_start[near + 1]
+                for other in range(bisect_right(run_ends, start, lo, hi), bisect_left(run_starts, end, lo, hi)):
+                    if not visited[other]:
+                        visited[other] = 1
+                        stack.append(other)
+
+    # Закрашиваем найденные отрезки разом: +1 в начале отрезка, -1 после конца, затем сумма по строке
+    filled = np.array(filled)
+    rows = np.array(run_rows)[filled]
+    starts, ends = np.array(run_starts)[filled], np.array(run_ends)[filled]
+    marks = np.zeros((height, width + 1), dtype=np.int8)
+    marks[rows, starts] = 1
+    marks[rows, ends] = -1
+    mask = np.cumsum(marks[:, :width], axis=1, dtype=np.int8) > 0
+    return mask, (int(starts.min()), int(rows.min()), int(ends.max()), int(rows.max()) + 1)
+
+
+# Размер плитки в пикселях: изображение хранится и показывается плитками TILE x TILE
+TILE = 256
+# Непрозрачный белый в формате пикселей изображения
+WHITE = 0xffffffff
+# Сторона окна заливки: огромное изображение заливается окнами, в памяти копия только одного окна
+FILL_LIMIT = 4096
+
+
+# Плитки размера tile, которые задевает прямоугольник (x0, y0, x1, y1)
+def tiles_in(bounds, width, height, tile=TILE):
+    x0, y0, x1, y1 = bounds
+    x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+    for ty in range(y0 // tile, (y1 - 1) // tile + 1 if y1 > y0 else 0):
+        for tx in range(x0 // tile, (x1 - 1) // tile + 1 if x1 > x0 else 0):
+            yield tx, ty
+
+
+# Прямоугольник, который покрывают плитки
+def tiles_bounds(keys, tile=TILE):
+    xs = [tx for tx, _ in keys]
+    ys = [ty for _, ty in keys]
+    return min(xs) * tile, min(ys) * tile, (max(xs) + 1) * tile, (max(ys) + 1) * tile
+
+
+# Пересекаются ли прямоугольники (x0, y0, x1, y1)
+def intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+# Плитка вдвое меньше: каждый пиксель — среднее квадрата 2x2 (для premultiplied-цветов это верно)
+def downsample(tile):
+    half = tile.shape[0] // 2
+    channels = tile.view(np.uint8).reshape(half, 2, half, 2, 4).astype(np.uint16)
+    mean = (channels[:, 0, :, 0] + channels[:, 0, :, 1] + channels[:, 1, :, 0] + channels[:, 1, :, 1] + 2) >> 2
+    return mean.astype(np.uint8).view(np.uint32).reshape(half, half)
+
+
+# Хранилище плиток одного уровня слоя в отображаемом в память файле подкачки.
+# Плитка лежит в файле одним куском, поэтому ОС подгружает и выгружает ее целиком.
+# Нетронутые плитки места не занимают (файл разреженный) и считаются залитыми цветом fill
+class TileStore:
+    def __init__(self, width, height, fill=0):
+        self.width, self.height = width, height
+        self.cols, self.rows = -(-width // TILE), -(-height // TILE)
+        self.fill = fill
+        self.tile_bytes = TILE * TILE * 4
+        # Временный файл удаляется сам, когда его закрывают
+        self.file = tempfile.TemporaryFile(prefix="picasso-", suffix=".tiles")
+        self.file.truncate(self.rows * self.cols * self.tile_bytes)
+        self.map = mmap.mmap(self.file.fileno(), self.rows * self.cols * self.tile_bytes)
+        self.tiles = np.frombuffer(self.map, dtype=np.uint32).reshape(self.rows, self.cols, TILE, TILE)
+        # Плитки, в которые что-то записано
+        self.allocated = np.zeros((self.rows, self.cols), dtype=bool)
+        # Плитки, к которым обращались с последней выгрузки: только они могут занимать память
+        self.resident = set()
+
+    # Пиксели плитки (без копирования) или None, если плитка нетронута и create не задан
+    def tile(self, key, create=False):
+        tx, ty = key
+        if not self.allocated[ty, tx]:
+            if not create:
+                return None
+            self.tiles[ty, tx] = self.fill
+            self.allocated[ty, tx] = True
+        self.resident.add(key)
+        return self.tiles[ty, tx]
+
+    # QImage поверх памяти плитки: QPainter рисует прямо в файл подкачки
+    def image(self, key):
+        pixels = self.tile(key, create=True)
+        return QImage(sip.voidptr(pixels.ctypes.data), TILE, TILE, TILE * 4,
+                      QImage.Format.Format_ARGB32_Premultiplied)
+
+    # Копия содержимого плитки для истории; None — плитка нетронута
+    def read(self, key):
+        pixels = self.tile(key)
+        return None if pixels is None else pixels.tobytes()
+
+    def write(self, key, data):
+        if data is None:
+            tx, ty = key
+            self.allocated[ty, tx] = False
+        else:
+            self.tile(key, create=True)[...] = np.frombuffer(data, dtype=np.uint32).reshape(TILE, TILE)
+
+    # Участки плиток под прямоугольником: (плитка, срез внутри плитки, срез внутри прямоугольника)
+    def parts(self, bounds):
+        x0, y0, x1, y1 = bounds
+        for key in tiles_in(bounds, self.width, self.height):
+            left, top = key[0] * TILE, key[1] * TILE
+            ax0, ay0 = max(x0, left), max(y0, top)
+            ax1, ay1 = min(x1, left + TILE, self.width), min(y1, top + TILE, self.height)
+            yield (key, (slice(ay0 - top, ay1 - top), slice(ax0 - left, ax1 - left)),
+                   (slice(ay0 - y0, ay1 - y0), slice(ax0 - x0, ax1 - x0)))
+
+    # Копия прямоугольной области изображения одним массивом
+    def region(self, bounds):
+        x0, y0, x1, y1 = bounds
+        pixels = np.empty((y1 - y0, x1 - x0), dtype=np.uint32)
+        for key, inner, outer in self.parts(bounds):
+            tile = self.tile(key)
+            pixels[outer] = self.fill if tile is None else tile[inner]
+        return pixels
+
+    # Отдаем страницы плиток обратно ОС: изменения остаются в файле, при обращении плитка подгрузится снова
+    def release(self, keys):
+        for tx, ty in keys:
+            self.resident.discard((tx, ty))
+            if hasattr(mmap, 'MADV_DONTNEED'):
+                self.map.madvise(mmap.MADV_DONTNEED, (ty * self.cols + tx) * self.tile_bytes, self.tile_bytes)
+
+    # Выгружаем все плитки, кроме нужных сейчас
+    def evict(self, keep):
+        self.release(self.resident - keep)
+
+    def close(self):
+        del self.tiles
+        try:
+            self.map.close()
+        except BufferError:
+            # Где-то еще жив массив поверх файла: отображение закроется вместе с ним
+            pass
+        self.file.close()
+
+
+# Один шаг истории: исходное содержимое плиток, которые изменило действие
+class TileEdit:
+    def __init__(self, tiles, target=None):
+        # (номер плитки по x, номер по y) -> байты пикселей плитки (None — плитка была нетронута)
+        self.tiles = tiles
+        # Слой, к которому относится шаг
+        self.target = target
+        self.compressed = False
+
+    # Сколько памяти занимает шаг
+    def size(self):
+        return sum(len(data) for data in self.tiles.values() if data is not None)
+
+    # Старые шаги сжимаются: однотонные плитки ужимаются в десятки раз
+    def compress(self):
+        if not self.compressed:
+            self.tiles = {key: data if data is None else zlib.compress(data, 1) for key, data in self.tiles.items()}
+            self.compressed = True
+
+    def data(self, key):
+        data = self.tiles[key]
+        return zlib.decompress(data) if self.compressed and data is not None else data
+
+
+# История отмены по плиткам: хранится только то, что изменилось, а не весь холст.
+# Отмена и возврат — это обмен содержимого плиток холста и шага, поэтому стоят O(число плиток)
+class TileHistory:
+    def __init__(self, budget=32 << 20, keep_raw=4):
+        # Предел памяти на всю историю в байтах
+        self.budget = budget
+        # Сколько последних шагов хранить без сжатия
+        self.keep_raw = keep_raw
+        self.undo_stack = []
+        self.redo_stack = []
+        # Плитки текущего незавершенного действия и его слой
+        self.current = None
+        self.target = None
+
+    def begin(self, target=None):
+        self.current = {}
+        self.target = target
+        # Уже сжатые копии текущего действия
+        self.packed = set()
+
+    # Вызывается до изменения плиток: копия плитки снимается один раз за действие
+    def touch(self, store, keys):
+        for key in keys:
+            if key not in self.current:
+                self.current[key] = store.read(key)
+
+    # Долгое действие (заливка по окнам) сжимает снятые копии сразу, а не держит их до конца
+    def pack(self):
+        for key, data in self.current.items():
+            if data is not None and key not in self.packed:
+                self.current[key] = zlib.compress(data, 1)
+                self.packed.add(key)
+
+    def commit(self):
+        if self.packed:
+            self.pack()
+        tiles, self.current = self.current, None
+        if tiles:
+            edit = TileEdit(tiles, self.target)
+            edit.compressed = bool(self.packed)
+            self.undo_stack.append(edit)
+            self.redo_stack.clear()
+            self.trim()
+
+    def size(self):
+        return sum(edit.size() for edit in self.undo_stack + self.redo_stack)
+
+    # Сжатие старых шагов и удаление самых старых, если история не помещается в предел
+    def trim(self):
+        for stack in (self.undo_stack, self.redo_stack):
+            for edit in stack[:-self.keep_raw]:
+                edit.compress()
+        size = self.size()
+        while size > self.budget and len(self.undo_stack) > 1:
+            size -= self.undo_stack.pop(0).size()
+        while size > self.budget and self.redo_stack:
+            size -= self.redo_stack.pop(0).size()
+
+    # Меняем местами плитки слоя и шага
+    def swap(self, store, edit):
+        tiles = {}
+        for key in edit.tiles:
+            tiles[key] = store.read(key)
+            store.write(key, edit.data(key))
+        edit.tiles, edit.compressed = tiles, False
+
+    # store_for(слой) возвращает плитки слоя шага; результат — (слой, список плиток) или None
+    def step(self, store_for, source, target):
+        if not source or self.current is not None:
+            return None
+        edit = source.pop()
+        self.swap(store_for(edit.target), edit)
+        target.append(edit)
+        self.trim()
+        return edit.target, list(edit.tiles)
+
+    def undo(self, store_for):
+        return self.step(store_for, self.undo_stack, self.redo_stack)
+
+    def redo(self, store_for):
+        return self.step(store_for, self.redo_stack, self.undo_stack)
+
+    # Удаленный слой: его шаги больше нельзя ни отменить, ни повторить
+    def forget(self, target):
+        self.undo_stack = [edit for edit in self.undo_stack if edit.target is not target]
+        self.redo_stack = [edit for edit in self.redo_stack if edit.target is not target]
+
+
+# Режимы наложения слоев
+BLEND_MODES = {
+    "Обычный": QPainter.CompositionMode.CompositionMode_SourceOver,
+    "Умножение": QPainter.CompositionMode.CompositionMode_Multiply,
+    "Экран": QPainter.CompositionMode.CompositionMode_Screen,
+    "Перекрытие": QPainter.CompositionMode.CompositionMode_Overlay,
+    "Затемнение": QPainter.CompositionMode.CompositionMode_Darken,
+    "Осветление": QPainter.CompositionMode.CompositionMode_Lighten,
+}
+
+
+# Слой: изображение в плитках со своей прозрачностью, видимостью и режимом наложения.
+# Кроме самого изображения хранятся уменьшенные копии (mip-уровни) для мелкого масштаба
+class Layer:
+    def __init__(self, name, width, height, fill=0):
+        self.name = name
+        # Уровень 0 — само изображение, каждый следующий вдвое меньше, последний — одна плитка
+        self.levels = [TileStore(width, height, fill)]
+        while self.levels[-1].cols > 1 or self.levels[-1].rows > 1:
+            below = self.levels[-1]
+            self.levels.append(TileStore(-(-below.width // 2), -(-below.height // 2), fill))
+        # Плитки уменьшенных уровней, которые устарели; пересчитываются, только когда их покажут
+        self.stale = [set() for _ in self.levels]
+        self.opacity = 1.0
+        self.visible = True
+        self.blend = "Обычный"
+        # Прямоугольник (x0, y0, x1, y1), где на слое что-то есть; None — слой пуст
+        self.bounds = None if fill == 0 else (0, 0, width, height)
+
+    # Расширяем занятую область слоя
+    def extend(self, bounds):
+        if self.bounds is None:
+            self.bounds = bounds
+        else:
+            self.bounds = (min(self.bounds[0], bounds[0]), min(self.bounds[1], bounds[1]),
+                           max(self.bounds[2], bounds[2]), max(self.bounds[3], bounds[3]))
+
+    # Плитки уровня 0 изменились: помечаем устаревшими плитки над ними на всех уровнях
+    def touched(self, keys):
+        for tx, ty in keys:
+            for level in range(1, len(self.levels)):
+                self.stale[level].add((tx >> level, ty >> level))
+
+    # Пиксели плитки уровня (None — плитка залита цветом слоя); устаревшая плитка сначала пересчитывается
+    def tile(self, level, key):
+        if key in self.stale[level]:
+            self.rebuild(level, key)
+        return self.levels[level].tile(key)
+
+    # Плитка уровня собирается из четырех уменьшенных плиток уровня ниже
+    def rebuild(self, level, key):
+        self.stale[level].discard(key)
+        store, below = self.levels[level], self.levels[level - 1]
+        children = [(dx, dy, (2 * key[0] + dx, 2 * key[1] + dy)) for dy in (0, 1) for dx in (0, 1)]
+        children = [(dx, dy, child) for dx, dy, child in children if child[0] < below.cols and child[1] < below.rows]
+        sources = [(dx, dy, self.tile(level - 1, child)) for dx, dy, child in children]
+        if all(pixels is None for _, _, pixels in sources):
+            store.write(key, None)
+            return
+        tile = store.tile(key, create=True)
+        tile[...] = store.fill
+        half = TILE // 2
+        for dx, dy, pixels in sources:
+            if pixels is not None:
+                tile[dy * half:(dy + 1) * half, dx * half:(dx + 1) * half] = downsample(pixels)
+        # Уровень ниже при этом масштабе не показывается: его плитки в памяти не нужны
+        below.release([child for _, _, child in children])
+
+    def close(self):
+        for store in self.levels:
+            store.close()
+
+
+# Перевод QRect в (x0, y0, x1, y1)
+def rect_bounds(rect):
+    return rect.left(), rect.top(), rect.right() + 1, rect.bottom() + 1
+
+
+# Сигналы фоновой заливки (QRunnable сам сигналы отправлять не умеет)
+class FillSignals(QObject):
+    finished = pyqtSignal(object)
+
+
+# Заливка окна выполняется в пуле потоков, чтобы большие области не подвешивали окно.
+# Результат — границы залитого и номера залитых пикселей на краях окна (верх, низ, лево, право)
+class FillTask(QRunnable):
+    def __init__(self, pixels, seeds, target, color, tolerance):
+        super().__init__()
+        self.args = (pixels, seeds, target, color, tolerance)
+        self.signals = FillSignals()
+
+    def run(self):
+        pixels, _, _, color, _ = self.args
+        found = flood_mask(*self.args)
+        if found is None:
+            self.signals.finished.emit(None)
+            return
+        mask, bounds = found
+        pixels[mask] = color
+        edges = tuple(np.flatnonzero(line) for line in (mask[0], mask[-1], mask[:, 0], mask[:, -1]))
+        self.signals.finished.emit((bounds, edges))
+
+
+# Класс холста: окно просмотра изображения любого размера с масштабом и прокруткой.
+# В памяти держатся только видимые и редактируемые плитки, остальное — в файлах подкачки
+class Canvas(QWidget):
+    def __init__(self, width=800, height=600):
         super().__init__()
-        # Создаем изображение размером 800x600 пикселей
-        pixmap = QPixmap(800, 600)
-        # Заполняем его белым цветом
-        pixmap.fill(Qt.GlobalColor.white)
-        # Назначаем изображение этому QLabel
-        self.setPixmap(pixmap)
-        # Устанавливаем фиксированный размер, чтобы QLabel не сжимался
-        self.setFixedSize(pixmap.size())
-
-        # Последние координаты мыши (для рисования линии)
-        self.last_x, self.last_y = None, None
+        # Виджет сам закрашивает каждый пиксель, фон под ним рисовать не нужно
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.setAttribute(Qt.WidgetAttribute.WA_StaticContents)
+        self.setMinimumSize(200, 150)
+        # Сведенные плитки всех слоев: (уровень, x, y) -> QImage; давно не показанные вытесняются
+        self.composite = OrderedDict()
+        self.cache_limit = 64
+        # Масштаб (экранных пикселей на пиксель изображения) и точка изображения в левом верхнем углу
+        self.scale = 1.0
+        self.origin = QPointF(0, 0)
+        # Точка, от которой тащим изображение средней или правой кнопкой
+        self.pan_from = None
+
+        # Точки текущего штриха, еще не нарисованные в буфер (первая — предыдущая для сглаживания)
+        self.points = []
+        # Были ли новые точки с прошлого кадра
+        self.fresh = False
+        # Нарисовано ли в текущем штрихе хоть что-то
+        self.stroke_drawn = False
+        # Рисовальщики штриха по плиткам: каждый открывается на плитке один раз за штрих
+        self.painters = None
+        self.pen = None
         # Цвет кисти (по умолчанию черный)
         self.pen_color = QColor("#000000")
         # Толщина линии
         self.pen_size = 4
+        # Текущий инструмент: 'brush' — кисть, 'fill' — заливка
+        self.tool = 'brush'
+        # Допуск заливки: насколько (0-255 по каждому каналу) цвет может отличаться от исходного
+        self.fill_tolerance = 32
+        # Идет ли сейчас фоновая заливка (пока идет, холст не принимает рисование)
+        self.fill_task = None
+        # Слой заливки и копия заливаемого окна: ((x0, y0, x1, y1), пиксели)
+        self.fill_layer = None
+        self.fill_region = None
+        # Окна, куда заливка еще должна перейти: (номер по x, номер по y) -> начальные точки
+        self.fill_queue = OrderedDict()
+        # Исходный цвет, цвет заливки и допуск текущей заливки
+        self.fill_args = None
 
-    # Обработка движения мыши по холсту
-    def mouseMoveEvent(self, e):
-        # Если это первое движение — просто запоминаем точку
-        if self.last_x is None:
-            self.last_x = e.position().x()
-            self.last_y = e.position().y()
-            return
-
-        # Получаем текущее изображение
-        canvas = self.pixmap()
-        # Создаем рисовальщика
-        painter = QPainter(canvas)
-        # Включаем сглаживание линий
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-
-        # Настраиваем кисть
-        pen = painter.pen()
-        pen.setWidth(self.pen_size)
-        pen.setColor(self.pen_color)
-        painter.setPen(pen)
-
-        # Рисуем линию от предыдущей точки до текущей
-        painter.drawLine(int(self.last_x), int(self.last_y), int(e.position().x()), int(e.position().y()))
-        # Завершаем рисование
+        # Таймер кадров: точки копятся и рисуются один раз за кадр, а не на каждое событие мыши
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.frame_timer.timeout.connect(self.next_frame)
+
+        self.layers = []
+        self.new_image(width, height)
+
+    # Новое изображение с белым фоном (или с готовым слоем фона background)
+    def new_image(self, width, height, fill=WHITE, background=None):
+        if self.busy():
+            return False
+        for layer in self.layers:
+            layer.close()
+        self.image_width, self.image_height = width, height
+        # Слои снизу вверх; нижний — фон
+        self.layers = [background or Layer("Фон", width, height, fill)]
+        # Номер слоя, на котором рисуем
+        self.active = 0
+        # История отмены
+        self.history = TileHistory()
+        self.composite.clear()
+        # Вписываем изображение в окно, как только станет известен размер виджета
+        self.pending_fit = True
+        if self.isVisible():
+            self.fit()
+        return True
+
+    # Открытие изображения: полосы строк переписываются в плитки нового слоя фона.
+    # Если формат умеет читать часть файла, целиком изображение в память не загружается,
+    # а полоса — около 64 МБ, чтобы файл не перечитывался лишний раз.
+    # Текущее изображение заменяется, только когда файл прочитан целиком без ошибок
+    def open_image(self, filename):
+        reader = QImageReader(filename)
+        size = reader.size()
+        if not size.isValid() or self.busy():
+            return False
+        # Снимаем ограничение Qt на размер читаемых изображений
+        QImageReader.setAllocationLimit(0)
+        banded = reader.supportsOption(QImageIOHandler.ImageOption.ClipRect)
+        whole = None if banded else reader.read()
+        if whole is not None and whole.isNull():
+            return False
+        width, height = size.width(), size.height()
+        layer = Layer("Фон", width, height, WHITE)
+        store = layer.levels[0]
+        band_height = max(1, (64 << 20) // (width * 4) // TILE) * TILE
+        for y in range(0, height, band_height):
+            rect = QRect(0, y, width, min(band_height, height - y))
+            if banded:
+                band_reader = QImageReader(filename)
+                band_reader.setClipRect(rect)
+                band = band_reader.read()
+            else:
+                band = whole.copy(rect)
+            if band.isNull():
+                layer.close()
+                return False
+            band = band.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+            bits = band.constBits()
+            bits.setsize(band.sizeInBytes())
+            rows = np.frombuffer(bits, dtype=np.uint32).reshape(band.height(), -1)
+            keys = []
+            for key, inner, outer in store.parts(rect_bounds(rect)):
+                store.tile(key, create=True)[inner] = rows[outer]
+                keys.append(key)
+            layer.touched(keys)
+            # Записанная полоса уже в файле подкачки, в памяти ее держать незачем
+            store.release(keys)
+        self.new_image(width, height, background=layer)
+        self.update()
+        return True
+
+    # Сохранение: сводим изображение по плиткам в одну картинку (она займет память целиком)
+    def save_image(self, filename):
+        image = QImage(self.image_width, self.image_height, QImage.Format.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        for key in tiles_in((0, 0, self.image_width, self.image_height), self.image_width, self.image_height):
+            painter.drawImage(key[0] * TILE, key[1] * TILE, self.render_tile(0, key))
+            for layer in self.layers:
+                layer.levels[0].release([key])
+        painter.end()
+        return image.save(filename)
+
+    # Активный слой и его плитки уровня 0
+    def layer(self):
+        return self.layers[self.active]
+
+    def store(self, layer=None):
+        return (layer or self.layer()).levels[0]
+
+    # --- Координаты и масштаб ---
+
+    # Точка виджета -> точка изображения
+    def to_image(self, point):
+        return self.origin + point / self.scale
+
+    # Прямоугольник изображения -> прямоугольник виджета (с запасом на сглаживание при масштабе)
+    def view_rect(self, bounds):
+        x0, y0, x1, y1 = bounds
+        rect = QRectF((x0 - self.origin.x()) * self.scale, (y0 - self.origin.y()) * self.scale,
+                      (x1 - x0) * self.scale, (y1 - y0) * self.scale)
+        return rect.toAlignedRect().adjusted(-1, -1, 1, 1)
+
+    # Видимая часть изображения (x0, y0, x1, y1) в прямоугольнике виджета rect
+    def image_bounds(self, rect):
+        top_left = self.to_image(QPointF(rect.topLeft()))
+        bottom_right = self.to_image(QPointF(rect.right() + 1, rect.bottom() + 1))
+        return (max(0, math.floor(top_left.x())), max(0, math.floor(top_left.y())),
+                min(self.image_width, math.ceil(bottom_right.x())), min(self.image_height, math.ceil(bottom_right.y())))
+
+    # Уровень детализации для масштаба: при уменьшении вдвое и больше берется уменьшенная копия
+    def level(self):
+        if self.scale >= 1:
+            return 0
+        return min(len(self.layers[0].levels) - 1, int(math.log2(1 / self.scale)))
+
+    # Самый мелкий масштаб: все изображение помещается примерно в одну плитку
+    def min_scale(self):
+        return min(1.0, TILE / max(self.image_width, self.image_height))
+
+    # Масштаб с сохранением точки изображения под pos (точкой виджета)
+    def zoom_at(self, factor, pos=None):
+        if pos is None:
+            pos = QPointF(self.width() / 2, self.height() / 2)
+        anchor = self.to_image(pos)
+        self.scale = min(32.0, max(self.min_scale(), self.scale * factor))
+        self.origin = anchor - pos / self.scale
+        self.update()
+
+    def zoom_in(self):
+        self.zoom_at(2 ** 0.5)
+
+    def zoom_out(self):
+        self.zoom_at(2 ** -0.5)
+
+    # Масштаб 1:1 с тем же центром
+    def actual_size(self):
+        self.zoom_at(1 / self.scale)
+
+    # Все изображение целиком по центру окна (крупнее 1:1 не увеличиваем)
+    def fit(self):
+        self.pending_fit = False
+        self.scale = max(self.min_scale(),
+                         min(1.0, self.width() / self.image_width, self.height() / self.image_height))
+        center = QPointF(self.image_width, self.image_height) / 2
+        self.origin = center - QPointF(self.width(), self.height()) / 2 / self.scale
+        self.update()
+
+    # Прокрутка на целое число экранных пикселей: уже нарисованное сдвигается, дорисовываются только края
+    def pan(self, pos):
+        dx, dy = round(pos.x() - self.pan_from.x()), round(pos.y() - self.pan_from.y())
+        if dx or dy:
+            self.origin -= QPointF(dx, dy) / self.scale
+            self.pan_from += QPointF(dx, dy)
+            self.scroll(dx, dy)
+
+    # --- Сведение слоев ---
+
+    # Сводим плитку уровня из всех видимых слоев
+    def render_tile(self, level, key):
+        tile = QImage(TILE, TILE, QImage.Format.Format_ARGB32_Premultiplied)
+        tile.fill(Qt.GlobalColor.white)
+        step = TILE << level
+        bounds = (key[0] * step, key[1] * step, (key[0] + 1) * step, (key[1] + 1) * step)
+        painter = QPainter(tile)
+        for layer in self.layers:
+            if not layer.visible or layer.bounds is None or not intersects(layer.bounds, bounds):
+                continue
+            painter.setOpacity(layer.opacity)
+            painter.setCompositionMode(BLEND_MODES[layer.blend])
+            store = layer.levels[level]
+            if layer.tile(level, key) is not None:
+                painter.drawImage(0, 0, store.image(key))
+            elif store.fill:
+                # Нетронутая плитка — сплошной цвет слоя
+                painter.fillRect(tile.rect(), QColor.fromRgba(qUnpremultiply(store.fill)))
         painter.end()
+        return tile
+
+    # Сведенная плитка из кэша; пересчитывается, только если ее там нет
+    def composite_tile(self, level, key):
+        cache_key = (level, *key)
+        tile = self.composite.get(cache_key)
+        if tile is None:
+            tile = self.composite[cache_key] = self.render_tile(level, key)
+        else:
+            self.composite.move_to_end(cache_key)
+        return tile
+
+    # Область изображения изменилась: сбрасываем сведенные плитки над ней на всех уровнях
+    def invalidate(self, bounds):
+        for cache_key in list(self.composite):
+            level, tx, ty = cache_key
+            step = TILE << level
+            if intersects((tx * step, ty * step, (tx + 1) * step, (ty + 1) * step), bounds):
+                del self.composite[cache_key]
+        self.update(self.view_rect(bounds))
+
+    # Слой изменился в плитках keys внутри прямоугольника bounds
+    def changed(self, bounds, keys, layer=None):
+        layer = layer or self.layer()
+        layer.extend(bounds)
+        layer.touched(keys)
+        self.invalidate(bounds)
+
+    # Память зависит от окна, а не от изображения: выгружаем все, что не видно и не рисуется
+    def trim_memory(self):
+        level = self.level()
+        visible = set(tiles_in(self.image_bounds(self.rect()), self.image_width, self.image_height, TILE << level))
+        self.cache_limit = max(64, 2 * len(visible))
+        while len(self.composite) > self.cache_limit:
+            self.composite.popitem(last=False)
+        editing = set(self.painters or ())
+        for layer in self.layers:
+            for index, store in enumerate(layer.levels):
+                store.evict((visible if index == level else set()) | (editing if index == 0 else set()))
+
+    # --- Рисование (все точки — в координатах изображения) ---
+
+    # Начало штриха: рисовальщики плиток откроются по мере того, как штрих их заденет
+    def begin_stroke(self, point):
+        self.painters = {}
+        # Настраиваем кисть: круглые концы и стыки, чтобы кривые соединялись без зазоров
+        self.pen = QPen(self.pen_color, self.pen_size, Qt.PenStyle.SolidLine,
+                        Qt.PenCapStyle.RoundCap, Qt.PenJoinStyle.RoundJoin)
+        self.history.begin(self.layer())
+        self.points = [point, point]
+        self.stroke_drawn = False
+        # Интервал таймера — длительность кадра экрана (по умолчанию 60 Гц)
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None and screen.refreshRate() > 0 else 60
+        self.frame_timer.setInterval(max(1, int(1000 / rate)))
+
+    # Рисовальщик плитки: перед первым рисованием плитка попадает в историю
+    def tile_painter(self, key):
+        if key not in self.painters:
+            store = self.store()
+            self.history.touch(store, [key])
+            image = store.image(key)
+            painter = QPainter(image)
+            # Включаем сглаживание линий
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(self.pen)
+            # Рисуем в координатах изображения: плитка сама отрежет то, что на нее не попало
+            painter.translate(-key[0] * TILE, -key[1] * TILE)
+            self.painters[key] = (painter, image)
+        return self.painters[key][0]
+
+    # Рисуем draw(painter) во всех плитках под прямоугольником dirty
+    def paint_tiles(self, dirty, draw):
+        bounds = rect_bounds(dirty)
+        keys = list(tiles_in(bounds, self.image_width, self.image_height))
+        if not keys:
+            return
+        for key in keys:
+            draw(self.tile_painter(key))
+        self.changed(bounds, keys)
+
+    # Добавление точки: только запоминаем, рисование — в следующем кадре
+    def add_point(self, point):
+        # Точки ближе полупикселя ничего не меняют на картинке
+        if (point - self.points[-1]).manhattanLength() < 0.5:
+            return
+        self.points.append(point)
+        self.fresh = True
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    # Кадр: рисуем накопленные точки; если мышь стоит — дорисовываем хвост и засыпаем
+    def next_frame(self):
+        final = not self.fresh
+        self.fresh = False
+        self.flush(final)
+        if final:
+            self.frame_timer.stop()
+
+    # Рисуем накопленные точки одной кривой Катмулла-Рома
+    def flush(self, final=False):
+        if self.painters is None:
+            return
+        points = self.points
+        path = QPainterPath(points[1])
+        i = 1
+        # Отрезку от points[i] до points[i+1] нужна следующая точка для касательной;
+        # последний отрезок ждет ее до следующего кадра, а в конце штриха рисуется без нее
+        while i + 2 < len(points) or (final and i + 1 < len(points)):
+            p0, p1, p2 = points[i - 1], points[i], points[i + 1]
+            p3 = points[i + 2] if i + 2 < len(points) else p2
+            path.cubicTo(p1 + (p2 - p0) / 6, p2 - (p3 - p1) / 6, p2)
+            i += 1
+        if i == 1:
+            return
+        # Прямоугольник вокруг кривой с запасом на толщину кисти
+        margin = self.pen_size / 2 + 2
+        dirty = path.controlPointRect().adjusted(-margin, -margin, margin, margin).toAlignedRect()
+        self.paint_tiles(dirty, lambda painter: painter.drawPath(path))
+        self.stroke_drawn = True
+        self.points = points[i - 1:]
+
+    # Конец штриха: дорисовываем остаток и закрываем рисовальщиков
+    def end_stroke(self):
+        self.frame_timer.stop()
+        if self.painters is not None:
+            self.flush(final=True)
+            # Щелчок без движения оставляет точку
+            if not self.stroke_drawn:
+                point = self.points[-1]
+                margin = self.pen_size / 2 + 2
+                dirty = QRectF(point, point).adjusted(-margin, -margin, margin, margin).toAlignedRect()
+                self.paint_tiles(dirty, lambda painter: painter.drawPoint(point))
+            for painter, _ in self.painters.values():
+                painter.end()
+            self.painters = None
+            self.history.commit()
+            self.trim_memory()
+        self.points = []
+
+    # Запуск заливки от точки щелчка. Изображение делится на окна FILL_LIMIT x FILL_LIMIT;
+    # если залитое доходит до края окна, заливка продолжается в соседнем окне от залитых точек края.
+    # Вся заливка — один шаг истории
+    def start_fill(self, point):
+        x, y = math.floor(point.x()), math.floor(point.y())
+        if self.busy() or not (0 <= x < self.image_width and 0 <= y < self.image_height):
+            return
+        color = qPremultiply(self.pen_color.rgba())
+        target = self.store().region((x, y, x + 1, y + 1))[0, 0]
+        if target == color:
+            return
+        self.fill_layer = self.layer()
+        self.fill_args = (target, color, self.fill_tolerance)
+        self.history.begin(self.fill_layer)
+        self.add_fill_seeds([(x, y)])
+        self.next_fill()
+
+    # Точки изображения раскладываются по окнам, в которых лежат
+    def add_fill_seeds(self, points):
+        for x, y in points:
+            self.fill_queue.setdefault((x // FILL_LIMIT, y // FILL_LIMIT), []).append((x, y))
+
+    # Заливка следующего окна из очереди; очередь пуста — заливка закончена
+    def next_fill(self):
+        if not self.fill_queue:
+            self.history.commit()
+            self.fill_layer = self.fill_args = None
+            self.trim_memory()
+            return
+        (cx, cy), seeds = self.fill_queue.popitem(last=False)
+        x0, y0 = cx * FILL_LIMIT, cy * FILL_LIMIT
+        bounds = (x0, y0, min(self.image_width, x0 + FILL_LIMIT), min(self.image_height, y0 + FILL_LIMIT))
+        self.fill_region = (bounds, self.store(self.fill_layer).region(bounds))
+        self.fill_task = FillTask(self.fill_region[1], [(x - x0, y - y0) for x, y in seeds],
+                                  *self.fill_args)
+        self.fill_task.signals.finished.connect(self.on_filled)
+        QThreadPool.globalInstance().start(self.fill_task)
+
+    # Окно залито: переносим в плитки только те участки, что изменились, и идем в соседние окна
+    def on_filled(self, result):
+        self.fill_task = None
+        ((x0, y0, x1, y1), pixels), self.fill_region = self.fill_region, None
+        if result is not None:
+            (fx0, fy0, fx1, fy1), (top, bottom, left, right) = result
+            bounds = (x0 + fx0, y0 + fy0, x0 + fx1, y0 + fy1)
+            pixels = pixels[fy0:fy1, fx0:fx1]
+            layer = self.fill_layer
+            store = self.store(layer)
+            keys = []
+            for key, inner, outer in store.parts(bounds):
+                tile = store.tile(key)
+                if tile is None:
+                    same = (pixels[outer] == store.fill).all()
+                else:
+                    same = np.array_equal(tile[inner], pixels[outer])
+                if same:
+                    continue
+                self.history.touch(store, [key])
+                store.tile(key, create=True)[inner] = pixels[outer]
+                keys.append(key)
+            if keys:
+                self.changed(bounds, keys, layer)
+            # Залитые точки на краю окна продолжают заливку в соседних окнах
+            if y0 > 0:
+                self.add_fill_seeds((x0 + int(x), y0 - 1) for x in top)
+            if y1 < self.image_height:
+                self.add_fill_seeds((x0 + int(x), y1) for x in bottom)
+            if x0 > 0:
+                self.add_fill_seeds((x0 - 1, y0 + int(y)) for y in left)
+            if x1 < self.image_width:
+                self.add_fill_seeds((x1, y0 + int(y)) for y in right)
+            # Заливка идет дальше: копии плиток уже залитых окон сжимаются, чтобы шаг не рос сырым
+            if self.fill_queue:
+                self.history.pack()
+        self.next_fill()
+
+    # Отмена и возврат недоступны посреди штриха или заливки
+    def undo(self):
+        if not self.busy():
+            self.restored(self.history.undo(self.store))
+
+    def redo(self):
+        if not self.busy():
+            self.restored(self.history.redo(self.store))
+
+    def restored(self, result):
+        if result is not None:
+            layer, keys = result
+            self.changed(tiles_bounds(keys), keys, layer)
 
-        # Обновляем изображение на холсте
-        self.setPixmap(canvas)
+    # Работа со слоями. Пока идет штрих или заливка, стек слоев не меняется
+    def busy(self):
+        return self.painters is not None or self.fill_task is not None
 
-        # Обновляем координаты
-        self.last_x = e.position().x()
-        self.last_y = e.position().y()
+    # Новый прозрачный слой над активным
+    def add_layer(self):
+        if self.busy():
+            return
+        self.active += 1
+        self.layers.insert(self.active, Layer(f"Слой {len(self.layers)}", self.image_width, self.image_height))
+
+    # Удаление активного слоя: пересводится только область, где на нем что-то было
+    def remove_layer(self):
+        if self.busy() or len(self.layers) == 1:
+            return
+        layer = self.layers.pop(self.active)
+        self.active = max(0, self.active - 1)
+        self.history.forget(layer)
+        if layer.bounds is not None:
+            self.invalidate(layer.bounds)
+        layer.close()
+
+    def set_active(self, index):
+        if not self.busy():
+            self.active = index
+
+    # Свойства слоя меняют вид только там, где на слое что-то есть
+    def set_layer_property(self, index, name, value):
+        layer = self.layers[index]
+        setattr(layer, name, value)
+        if layer.bounds is not None:
+            self.invalidate(layer.bounds)
+
+    # --- События ---
+
+    # Левая кнопка начинает штрих или заливку, средняя и правая двигают изображение
+    def mousePressEvent(self, e):
+        if e.button() in (Qt.MouseButton.MiddleButton, Qt.MouseButton.RightButton):
+            self.pan_from = e.position()
+            return
+        if e.button() != Qt.MouseButton.LeftButton or self.fill_task is not None:
+            return
+        if self.tool == 'fill':
+            self.start_fill(self.to_image(e.position()))
+        else:
+            self.begin_stroke(self.to_image(e.position()))
+
+    # Обработка движения мыши по холсту
+    def mouseMoveEvent(self, e):
+        if self.pan_from is not None:
+            self.pan(e.position())
+            return
+        if self.tool != 'brush' or self.fill_task is not None:
+            return
+        # Если штрих еще не начат — начинаем его с текущей точки
+        if self.painters is None:
+            self.begin_stroke(self.to_image(e.position()))
+            return
+        self.add_point(self.to_image(e.position()))
 
-    # Когда отпускаем мышь — сбрасываем координаты
+    # Когда отпускаем мышь — завершаем штрих или прокрутку
     def mouseReleaseEvent(self, e):
-        self.last_x = None
-        self.last_y = None
+        if e.button() in (Qt.MouseButton.MiddleButton, Qt.MouseButton.RightButton):
+            self.pan_from = None
+            self.trim_memory()
+            return
+        self.end_stroke()
+
+    # Колесо мыши меняет масштаб вокруг курсора
+    def wheelEvent(self, e):
+        self.zoom_at(2 ** (e.angleDelta().y() / 480), e.position())
+        self.trim_memory()
+
+    def resizeEvent(self, e):
+        if self.pending_fit:
+            self.fit()
+
+    # Отрисовка: только плитки под запрошенной областью, с уровня детализации под масштаб
+    def paintEvent(self, e):
+        painter = QPainter(self)
+        # Вне изображения — серый фон
+        painter.fillRect(e.rect(), QColor("#808080"))
+        level = self.level()
+        step = TILE << level
+        bounds = self.image_bounds(e.rect())
+        keys = list(tiles_in(bounds, self.image_width, self.image_height, step))
+        if self.scale < 1:
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        store = self.layers[0].levels[level]
+        for key in keys:
+            tile = self.composite_tile(level, key)
+            # Края плитки округляются одинаково для соседей, чтобы между ними не было щелей
+            width, height = min(TILE, store.width - key[0] * TILE), min(TILE, store.height - key[1] * TILE)
+            left = round((key[0] * step - self.origin.x()) * self.scale)
+            top = round((key[1] * step - self.origin.y()) * self.scale)
+            right = round((key[0] * step + (width << level) - self.origin.x()) * self.scale)
+            bottom = round((key[1] * step + (height << level) - self.origin.y()) * self.scale)
+            painter.drawImage(QRect(left, top, right - left, bottom - top), tile, QRect(0, 0, width, height))
+        painter.end()
+        if self.painters is None:
+            self.trim_memory()
 
 # Главное окно приложения
 class MainWindow(QMainWindow):
@@ -74,8 +998,8 @@ class MainWindow(QMainWindow):
 
         # Название окна
         self.setWindowTitle("Picasso")
-        # Размер окна
-        self.setFixedSize(QSize(800, 600))
+        # Начальный размер окна; холст масштабируется, поэтому окно можно растягивать
+        self.resize(QSize(1000, 700))
 
         # --- Меню ---
 
@@ -93,18 +1017,46 @@ class MainWindow(QMainWindow):
         file_menu.addAction(open_action)
         file_menu.addAction(save_action)
 
+        # Меню "Правка" с отменой и возвратом (сочетания клавиш — как принято в системе)
+        edit_menu = main_menu.addMenu("Правка")
+        undo_action = QAction("Отменить", self)
+        undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        redo_action = QAction("Повторить", self)
+        redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        edit_menu.addAction(undo_action)
+        edit_menu.addAction(redo_action)
+
+        # Меню "Вид": масштаб (колесо мыши тоже масштабирует, средняя или правая кнопка — двигает)
+        view_menu = main_menu.addMenu("Вид")
+        zoom_in_action = QAction("Увеличить", self)
+        zoom_in_action.setShortcut(QKeySequence.StandardKey.ZoomIn)
+        zoom_out_action = QAction("Уменьшить", self)
+        zoom_out_action.setShortcut(QKeySequence.StandardKey.ZoomOut)
+        fit_action = QAction("Вписать в окно", self)
+        fit_action.setShortcut("Ctrl+0")
+        actual_size_action = QAction("Реальный размер", self)
+        actual_size_action.setShortcut("Ctrl+1")
+        for action in (zoom_in_action, zoom_out_action, fit_action, actual_size_action):
+            view_menu.addAction(action)
+
         # --- Холст ---
 
         # Создаем объект холста и делаем его центральным виджетом
         self.canvas = Canvas()
         self.setCentralWidget(self.canvas)
+        undo_action.triggered.connect(self.canvas.undo)
+        redo_action.triggered.connect(self.canvas.redo)
+        zoom_in_action.triggered.connect(self.canvas.zoom_in)
+        zoom_out_action.triggered.connect(self.canvas.zoom_out)
+        fit_action.triggered.connect(self.canvas.fit)
+        actual_size_action.triggered.connect(self.canvas.actual_size)
 
         # --- Обработка пунктов меню ---
 
         # При нажатии выполняются методы
-        new_img_action.triggered.connect(self.new_img_text)
-        open_action.triggered.connect(self.open_img_text)
-        save_action.triggered.connect(self.save_img_text)
+        new_img_action.triggered.connect(self.new_image)
+        open_action.triggered.connect(self.open_image)
+        save_action.triggered.connect(self.save_image)
 
         # Создаем панели инструментов
         self.create_toolbars()
@@ -120,16 +1072,19 @@ class MainWindow(QMainWindow):
         # Кнопка "Создать"
         new_img_button = QPushButton()
         new_img_button.setIcon(QIcon("icons/new-image.png"))
+        new_img_button.clicked.connect(self.new_image)
         self.fileToolbar.addWidget(new_img_button)
 
         # Кнопка "Открыть"
         open_img_button = QPushButton()
         open_img_button.setIcon(QIcon("icons/open-image.png"))
+        open_img_button.clicked.connect(self.open_image)
         self.fileToolbar.addWidget(open_img_button)
 
         # Кнопка "Сохранить"
         save_img_button = QPushButton()
         save_img_button.setIcon(QIcon("icons/save-image.png"))
+        save_img_button.clicked.connect(self.save_image)
         self.fileToolbar.addWidget(save_img_button)
 
         # --- Панель "Слайдер" для толщины линии ---
@@ -164,6 +1119,7 @@ class MainWindow(QMainWindow):
         brush_button = QPushButton()
         brush_button.setIcon(QIcon("icons/paint-brush.png"))
         brush_button.setCheckable(True)
+        brush_button.setChecked(True)
         self.drawingToolbar.addWidget(brush_button)
 
         # Кнопка "Заливка"
@@ -183,6 +1139,22 @@ class MainWindow(QMainWindow):
         picker_button.setIcon(QIcon("icons/pipette.png"))
         picker_button.setCheckable(True)
         self.drawingToolbar.addWidget(picker_button)
+
+        # Кисть и заливка взаимоисключающие: выбранная кнопка задает инструмент холста
+        self.tool_group = QButtonGroup(self)
+        self.tool_group.addButton(brush_button)
+        self.tool_group.addButton(can_button)
+        brush_button.clicked.connect(lambda: self.set_tool('brush'))
+        can_button.clicked.connect(lambda: self.set_tool('fill'))
+
+        # Допуск заливки
+        self.drawingToolbar.addWidget(QLabel(" Допуск: "))
+        self.tolerance_box = QSpinBox()
+        self.tolerance_box.setRange(0, 255)
+        self.tolerance_box.setValue(self.canvas.fill_tolerance)
+        self.tolerance_box.setToolTip("Насколько цвет может отличаться от цвета под курсором, чтобы его залить")
+        self.tolerance_box.valueChanged.connect(self.change_fill_tolerance)
+        self.drawingToolbar.addWidget(self.tolerance_box)
  
         # --- Нижняя панель для выбора цвета ---
         self.bottomToolbar = QToolBar(self)
@@ -204,6 +1176,47 @@ class MainWindow(QMainWindow):
         self.color_button.clicked.connect(self.choose_color)  # Выбор цвета по нажатию
         self.bottomToolbar.addWidget(self.color_button)
 
+        # --- Нижняя панель слоев ---
+        self.layersToolbar = QToolBar(self)
+        self.layersToolbar.setObjectName("layersToolbar")
+        self.addToolBar(Qt.ToolBarArea.BottomToolBarArea, self.layersToolbar)
+
+        # Список слоев (сверху — верхний слой)
+        self.layersToolbar.addWidget(QLabel(" Слой: "))
+        self.layer_box = QComboBox()
+        self.layer_box.currentIndexChanged.connect(self.select_layer)
+        self.layersToolbar.addWidget(self.layer_box)
+
+        # Добавить и удалить слой
+        add_layer_button = QPushButton("+")
+        add_layer_button.setToolTip("Новый слой")
+        add_layer_button.clicked.connect(self.add_layer)
+        self.layersToolbar.addWidget(add_layer_button)
+        remove_layer_button = QPushButton("−")
+        remove_layer_button.setToolTip("Удалить слой")
+        remove_layer_button.clicked.connect(self.remove_layer)
+        self.layersToolbar.addWidget(remove_layer_button)
+
+        # Видимость слоя
+        self.visible_box = QCheckBox("Видимый")
+        self.visible_box.toggled.connect(lambda value: self.change_layer('visible', value))
+        self.layersToolbar.addWidget(self.visible_box)
+
+        # Непрозрачность слоя в процентах
+        self.layersToolbar.addWidget(QLabel(" Непрозрачность: "))
+        self.opacity_slider = QSlider(Qt.Orientation.Horizontal)
+        self.opacity_slider.setRange(0, 100)
+        self.opacity_slider.valueChanged.connect(lambda value: self.change_layer('opacity', value / 100))
+        self.layersToolbar.addWidget(self.opacity_slider)
+
+        # Режим наложения слоя
+        self.blend_box = QComboBox()
+        self.blend_box.addItems(BLEND_MODES)
+        self.blend_box.currentTextChanged.connect(lambda value: self.change_layer('blend', value))
+        self.layersToolbar.addWidget(self.blend_box)
+
+        self.update_layers()
+
     # Добавление кнопки с иконкой в тулбар (без текста)
     def add_toolbar_button(self, toolbar, icon_path):
         button = QPushButton()
@@ -213,26 +1226,73 @@ class MainWindow(QMainWindow):
     def change_pen_size(self, value):
         self.canvas.pen_size = value  # Устанавливаем толщину линии для кисти
 
-    # Цветовой эффект на старый label (не используется с Canvas)
-    def change_color(self, color_name):
-        color_effect = QGraphicsColorizeEffect()
-        color_effect.setColor(QColor(color_name))
-        self.label.setGraphicsEffect(color_effect)
+    def set_tool(self, tool):
+        self.canvas.tool = tool  # Переключаем инструмент холста
+
+    # Номер слоя в списке: сверху показывается верхний слой
+    def layer_row(self, index):
+        return len(self.canvas.layers) - 1 - index
+
+    # Обновляем панель слоев по состоянию холста (без повторных сигналов)
+    def update_layers(self):
+        canvas = self.canvas
+        layer = canvas.layer()
+        widgets = (self.layer_box, self.visible_box, self.opacity_slider, self.blend_box)
+        for widget in widgets:
+            widget.blockSignals(True)
+        self.layer_box.clear()
+        self.layer_box.addItems([item.name for item in reversed(canvas.layers)])
+        self.layer_box.setCurrentIndex(self.layer_row(canvas.active))
+        self.visible_box.setChecked(layer.visible)
+        self.opacity_slider.setValue(round(layer.opacity * 100))
+        self.blend_box.setCurrentText(layer.blend)
+        for widget in widgets:
+            widget.blockSignals(False)
+
+    def select_layer(self, row):
+        if row >= 0:
+            self.canvas.set_active(self.layer_row(row))
+        self.update_layers()
+
+    def add_layer(self):
+        self.canvas.add_layer()
+        self.update_layers()
 
-    # Реакция на пункт меню "Создать"
-    def new_img_text(self):
-        self.label.setText("НОВОЕ ИЗОБРАЖЕНИЕ")
-        self.change_color("green")
+    def remove_layer(self):
+        self.canvas.remove_layer()
+        self.update_layers()
+
+    def change_layer(self, name, value):
+        self.canvas.set_layer_property(self.canvas.active, name, value)
+
+    def change_fill_tolerance(self, value):
+        self.canvas.fill_tolerance = value  # Устанавливаем допуск заливки
+
+    # Реакция на пункт меню "Создать": спрашиваем размер нового изображения
+    def new_image(self):
+        width, ok = QInputDialog.getInt(self, "Новое изображение", "Ширина:", self.canvas.image_width, 1, 1000000)
+        if not ok:
+            return
+        height, ok = QInputDialog.getInt(self, "Новое изображение", "Высота:", self.canvas.image_height, 1, 1000000)
+        if ok and self.canvas.new_image(width, height):
+            self.update_layers()
 
     # Реакция на пункт меню "Открыть"
-    def open_img_text(self):
-        self.label.setText("ОТКРЫТЬ ИЗОБРАЖЕНИЕ")
-        self.change_color("blue")
+    def open_image(self):
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Открыть изображение", "", "Изображения (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)")
+        if not filename:
+            return
+        if self.canvas.open_image(filename):
+            self.update_layers()
+        else:
+            QMessageBox.warning(self, "Picasso", f"Не удалось открыть {filename}")
 
     # Реакция на пункт меню "Сохранить"
-    def save_img_text(self):
-        self.label.setText("СОХРАНИТЬ ИЗОБРАЖЕНИЕ")
-        self.change_color("red")
+    def save_image(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "Сохранить изображение", "", "PNG (*.png);;JPEG (*.jpg)")
+        if filename and not self.canvas.save_image(filename):
+            QMessageBox.warning(self, "Picasso", f"Не удалось сохранить {filename}")
 
     # Метод выбора цвета с помощью диалога
     def choose_color(self):
@@ -241,8 +1301,9 @@ class MainWindow(QMainWindow):
             self.canvas.pen_color = color  # Применяем к кисти
 
 
-# Запуск приложения
-app = QApplication(sys.argv)  # Создаем приложение
-window = MainWindow()         # Создаем главное окно
-window.show()                 # Показываем окно пользователю
-app.exec()                    # Запускаем цикл событий
+# Запуск приложения (при импорте модуля, например из benchmarks.py, окно не создается)
+if __name__ == "__main__":
+    app = QApplication(sys.argv)  # Создаем приложение
+    window = MainWindow()         # Создаем главное окно
+    window.show()                 # Показываем окно пользователю
+    app.exec()                    # Запускаем цикл событий
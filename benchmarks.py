@@ -0,0 +1,493 @@
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from providers import ProviderRegistry, OnlineProvider, OfflineProvider
+from telemetry import metrics
+from translator_core import (
+    TextTranslator, PhraseDatabase, SqlitePhraseStorage, TranslationCache, TranslationHistory, detect_language
+)
+
+
+class StubTranslateHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        text = query.get('q', [''])[0]
+        segments = [[line[::-1] + end, line + end, None, None]
+                    for line, end in zip(text.split('\n'), ['\n'] * text.count('\n') + [''])]
+        body = json.dumps([segments, None, query.get('sl', [''])[0]]).encode('utf-8')
+        time.sleep(self.server.latency)
+        if self.server.fails(text):
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTranslateServer(ThreadingHTTPServer):
+    def __init__(self, latency=0.0, error_rate=0.0, seed=1):
+        super().__init__(('127.0.0.1', 0), StubTranslateHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def fails(self, text):
+        # Решение зависит только от текста и номера попытки, а не от порядка запросов
+        if not self.error_rate:
+            return False
+        with self.lock:
+            attempt = self.attempts[text] = self.attempts.get(text, 0) + 1
+        return random.Random(f"{self.seed}:{attempt}:{text}").random() < self.error_rate
+
+
+def start_stub_server(latency=0.0, error_rate=0.0, seed=1):
+    server = StubTranslateServer(latency, error_rate, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/translate_a/single"
+
+
+def measure(call, count):
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        call(f"phrase {i}")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<24} mean {statistics.mean(timings):7.3f} ms   "
+          f"median {statistics.median(timings):7.3f} ms   "
+          f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.3f} ms")
+
+
+def bench_connection_reuse(count=500):
+    server, url = start_stub_server()
+    try:
+        def fresh_connection(text):
+            params = {'client': 'gtx', 'sl': 'ru', 'tl': 'en', 'dt': 't', 'q': text}
+            return requests.get(url, params=params, timeout=5).json()[0][0][0]
+
+        pooled = TextTranslator(url=url, rate_limit=0)
+        fresh = measure(fresh_connection, count)
+        reused = measure(lambda text: pooled.translate(text, 'en'), count)
+        pooled.close()
+    finally:
+        server.shutdown()
+
+    print(f"Connection reuse, {count} requests against {url}")
+    report("requests.get per call", fresh)
+    report("pooled TextTranslator", reused)
+    print(f"saved per request: {statistics.mean(fresh) - statistics.mean(reused):.3f} ms")
+
+
+def bench_batch(count=200, latency=0.02):
+    server, url = start_stub_server(latency)
+    try:
+        translator = TextTranslator(url=url, rate_limit=0)
+        texts = [f"phrase number {i}" for i in range(count)]
+
+        start = time.perf_counter()
+        one_by_one = [translator.translate(text, 'en') for text in texts]
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = translator.translate_batch(texts, 'en')
+        packed = time.perf_counter() - start
+        translator.close()
+    finally:
+        server.shutdown()
+
+    assert batched == one_by_one
+    print(f"Batch translation, {count} phrases, {latency * 1000:.0f} ms simulated RTT")
+    print(f"translate() per phrase   {sequential * 1000:9.1f} ms")
+    print(f"translate_batch()        {packed * 1000:9.1f} ms")
+
+
+LANGUAGE_CORPUS = [
+    ("Привет", 'ru'),
+    ("Как дела?", 'ru'),
+    ("Спасибо за помощь!", 'ru'),
+    ("Сегодня хорошая погода, пойдём гулять.", 'ru'),
+    ("ёж", 'ru'),
+    ("Я", 'ru'),
+    ("Запустите npm install и перезапустите сервер", 'ru'),
+    ("Версия Python 3.12 уже вышла", 'ru'),
+    ("Встреча в 10:30 в офисе на Ленина, 5", 'ru'),
+    ("Он сказал: «OK, договорились»", 'ru'),
+    ("Эта статья о Linux, Windows и macOS", 'ru'),
+    ("ПРОШУ НЕ БЕСПОКОИТЬ", 'ru'),
+    ("Hello", 'en'),
+    ("How are you?", 'en'),
+    ("Thanks for the help!", 'en'),
+    ("The weather is nice today, let's go for a walk.", 'en'),
+    ("I", 'en'),
+    ("Run npm install and restart the server", 'en'),
+    ("Meet me at 10:30 near Gorky Park", 'en'),
+    ("She said «да» and left", 'en'),
+    ("The word 'спасибо' means thank you", 'en'),
+    ("DO NOT DISTURB", 'en'),
+    ("Python 3.12 is out", 'en'),
+    ("e-mail: user@example.com", 'en'),
+    ("12345", None),
+    ("...", None),
+    ("", None),
+    (":-)", None),
+]
+
+
+def bench_language_detection(repeat=2000):
+    def any_cyrillic(text):
+        # Прежнее правило: русский, если есть хотя бы одна кириллическая буква
+        if not any(ch.isalpha() for ch in text):
+            return None
+        return 'ru' if any('а' <= ch.lower() <= 'я' or ch in 'ёЁ' for ch in text) else 'en'
+
+    long_text = " ".join(text for text, _ in LANGUAGE_CORPUS) * 50
+    print(f"Language detection, {len(LANGUAGE_CORPUS)} labeled samples")
+    for name, detect in (("detect_language", detect_language), ("any Cyrillic letter", any_cyrillic)):
+        errors = [(text, label) for text, label in LANGUAGE_CORPUS if detect(text) != label]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text, _ in LANGUAGE_CORPUS:
+                detect(text)
+        per_call = (time.perf_counter() - start) / (repeat * len(LANGUAGE_CORPUS)) * 1e6
+        start = time.perf_counter()
+        for _ in range(100):
+            detect(long_text)
+        per_long = (time.perf_counter() - start) / 100 * 1e6
+        print(f"{name:<24} accuracy {1 - len(errors) / len(LANGUAGE_CORPUS):6.1%}   "
+              f"{per_call:6.2f} us/call   {per_long:8.1f} us per {len(long_text)} chars")
+        for text, label in errors:
+            print(f"    wrong: {text!r} (expected {label})")
+
+
+def engine_workload(count, repeat, seed):
+    rng = random.Random(seed)
+    seen = []
+    for i in range(count):
+        if seen and rng.random() < repeat:
+            yield rng.choice(seen)
+        else:
+            text = f"тестовая фраза номер {i} про тему {rng.randrange(1000)}"
+            seen.append(text)
+            yield text
+
+
+def bench_engine(count=1000, latency=0.005, error_rate=0.05, repeat=0.5, seed=1, metrics_out=None):
+    server, url = start_stub_server(latency, error_rate, seed)
+    metrics.reset()
+    rng = random.Random(seed)
+    failed = 0
+    with tempfile.TemporaryDirectory() as directory:
+        translator = TextTranslator(url=url, rate_limit=0, backoff=0.01, max_backoff=0.1)
+        database = PhraseDatabase(SqlitePhraseStorage(os.path.join(directory, 'phrases.db')),
+                                  legacy_file=os.path.join(directory, 'phrases.json'))
+        cache = TranslationCache(database)
+        history = TranslationHistory(os.path.join(directory, 'history.jsonl'),
+                                     legacy_file=os.path.join(directory, 'history.json'))
+        providers = ProviderRegistry()
+        providers.register(OnlineProvider(translator))
+        providers.register(OfflineProvider(database))
+        metrics.register('cache', cache.stats)
+        metrics.register('providers', providers.stats)
+
+        # Тот же порядок действий, что и в TranslationTab.translate_text
+        start = time.perf_counter()
+        for text in engine_workload(count, repeat, seed):
+            with metrics.timer('engine.translate'):
+                translation = cache.get(text, 'en')
+                provider = 'local'
+                if translation is None:
+                    translation, provider = providers.translate_with_source(text, 'en')
+                if translation is None:
+                    failed += 1
+                    continue
+                history.add_entry(text, translation, provider, 'ru', 'en')
+                history.save_history()
+                if provider == 'online':
+                    # Пользователь сохраняет в базу примерно каждый четвертый перевод
+                    cache.put(text, 'en', translation, persist=rng.random() < 0.25)
+        elapsed = time.perf_counter() - start
+        history.sync()
+        snapshot = metrics.snapshot()
+        if metrics_out:
+            with open(metrics_out, 'w', encoding='utf-8') as f:
+                f.write(metrics.to_json() if metrics_out.endswith('.json') else metrics.to_prometheus())
+
+        metrics.unregister('cache')
+        metrics.unregister('providers')
+        providers.close()
+        history.close()
+        database.close()
+    server.shutdown()
+
+    print(f"Engine, {count} requests, {repeat:.0%} repeated, {latency * 1000:.0f} ms simulated RTT, "
+          f"{error_rate:.0%} server errors, seed {seed}")
+    print(f"{count / elapsed:.0f} requests/s, {failed} failed, "
+          f"cache hit rate {snapshot['gauges']['cache.hit_rate']:.1%}")
+    print(f"{'':<28} {'calls':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, timer in snapshot['timers'].items():
+        print(f"{name:<28} {timer['count']:7} " + " ".join(
+            f"{timer[q] * 1000:6.2f} ms" for q in ('p50', 'p95', 'p99')
+        ))
+    for name, value in snapshot['counters'].items():
+        print(f"{name:<28} {value:7}")
+    if metrics_out:
+        print(f"metrics written to {metrics_out}")
+
+
+def bench_canvas_stroke(rates=(125, 500, 1000, 2000), duration=2.0, pen_size=20):
+    # Холсту не нужен экран; Qt загружается только для этого теста
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import QEvent, QPointF, Qt
+    from PyQt6.QtGui import QMouseEvent
+    from PyQt6.QtWidgets import QApplication
+    from Smirnov import Canvas
+
+    app = QApplication.instance() or QApplication([])
+
+    def send(canvas, kind, point, button):
+        QApplication.sendEvent(canvas, QMouseEvent(kind, point, point, button, Qt.MouseButton.LeftButton,
+                                                   Qt.KeyboardModifier.NoModifier))
+
+    print(f"Canvas stroke, {duration:.0f} s of input per rate, {pen_size}px brush")
+    print(f"{'input':>8} {'events':>7} {'frames':>7} {'pts/frame':>10} "
+          f"{'frame CPU p50':>14} {'p95':>8} {'max':>8} {'input CPU/event':>16}")
+    for rate in rates:
+        canvas = Canvas()
+        canvas.pen_size = pen_size
+        canvas.show()
+        frame_times, frame_points = [], []
+        flush = canvas.flush
+
+        def timed_flush(final=False):
+            frame_points.append(len(canvas.points) - 2)
+            start = time.thread_time()
+            flush(final)
+            frame_times.append(time.thread_time() - start)
+
+        canvas.flush = timed_flush
+        send(canvas, QEvent.Type.MouseButtonPress, QPointF(400, 300), Qt.MouseButton.LeftButton)
+        sent, input_time = 0, 0.0
+        start = time.perf_counter()
+        while (now := time.perf_counter() - start) < duration:
+            due = int(now * rate)
+            if due > sent:
+                cpu = time.thread_time()
+                for i in range(sent, due):
+                    # Одна и та же траектория при любой частоте событий
+                    t = i / rate
+                    point = QPointF(400 + 300 * math.sin(t * 1.3), 300 + 250 * math.sin(t * 2.1))
+                    send(canvas, QEvent.Type.MouseMove, point, Qt.MouseButton.NoButton)
+                input_time += time.thread_time() - cpu
+                sent = due
+            app.processEvents()
+        send(canvas, QEvent.Type.MouseButtonRelease, QPointF(400, 300), Qt.MouseButton.LeftButton)
+        app.processEvents()
+        canvas.close()
+        canvas.deleteLater()
+
+        frame_times.sort()
+        print(f"{rate:>5} Hz {sent:7} {len(frame_times):7} {statistics.mean(frame_points):10.1f} "
+              f"{frame_times[len(frame_times) // 2] * 1000:11.3f} ms "
+              f"{frame_times[int(len(frame_times) * 0.95)] * 1000:5.3f} ms {frame_times[-1] * 1000:5.3f} ms "
+              f"{input_time / max(1, sent) * 1e6:13.1f} us")
+    print(f"frame budget at 60 Hz: {1000 / 60:.1f} ms")
+
+
+def bench_flood_fill(width=800, height=600, repeat=5):
+    import numpy as np
+    from Smirnov import flood_fill
+
+    def naive_fill(pixels, x, y, color):
+        # Попиксельный обход в ширину, как было бы без NumPy
+        seed = pixels[y][x]
+        queue, seen = [(x, y)], {(x, y)}
+        while queue:
+            x, y = queue.pop()
+            pixels[y][x] = color
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= nx < width and 0 <= ny < height and (nx, ny) not in seen and pixels[ny][nx] == seed:
+                    seen.add((nx, ny))
+                    queue.append((nx, ny))
+
+    white, color = 0xffffffff, 0xff1e90ff
+    blank = np.full((height, width), white, dtype=np.uint32)
+    # Лабиринт: вертикальные стенки через каждые 8 пикселей с проходами поочередно сверху и снизу
+    maze = blank.copy()
+    for i, x in enumerate(range(4, width, 8)):
+        maze[8:, x] = 0xff000000 if i % 2 else white
+        maze[:-8, x] = 0xff000000 if not i % 2 else maze[:-8, x]
+    # Шум: каждый пиксель слегка отличается, заливается только с допуском
+    noisy = (blank - np.random.default_rng(1).integers(0, 16, blank.shape, dtype=np.uint32) * 0x010101)
+
+    print(f"Flood fill, {width}x{height} canvas")
+    print(f"{'scene':<22} {'flood_fill':>12} {'per-pixel BFS':>15}")
+    for name, scene, tolerance in (("blank", blank, 0), ("maze", maze, 0), ("noise, tolerance 16", noisy, 16)):
+        timings = []
+        for _ in range(repeat):
+            pixels = scene.copy()
+            start = time.perf_counter()
+            flood_fill(pixels, 0, 0, color, tolerance)
+            timings.append(time.perf_counter() - start)
+        naive = ''
+        if not tolerance:
+            rows = scene.tolist()
+            start = time.perf_counter()
+            naive_fill(rows, 0, 0, color)
+            naive = f"{(time.perf_counter() - start) * 1000:12.0f} ms"
+            assert rows == pixels.tolist()
+        print(f"{name:<22} {min(timings) * 1000:9.1f} ms {naive:>15}")
+
+
+def bench_canvas_undo(strokes=300, points=20):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import QPointF
+    from PyQt6.QtWidgets import QApplication
+    from Smirnov import Canvas, TILE
+
+    app = QApplication.instance() or QApplication([])
+    canvas = Canvas()
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(strokes):
+        x, y = rng.uniform(0, 800), rng.uniform(0, 600)
+        canvas.begin_stroke(QPointF(x, y))
+        for _ in range(points):
+            x, y = x + rng.uniform(-10, 10), y + rng.uniform(-10, 10)
+            canvas.add_point(QPointF(x, y))
+        canvas.end_stroke()
+    draw = time.perf_counter() - start
+    history = canvas.history
+    size = history.size()
+
+    start = time.perf_counter()
+    while history.undo_stack:
+        canvas.undo()
+    undo = time.perf_counter() - start
+    start = time.perf_counter()
+    while history.redo_stack:
+        canvas.redo()
+    redo = time.perf_counter() - start
+    canvas.deleteLater()
+    app.processEvents()
+
+    full_copy = canvas.image_width * canvas.image_height * 4 * strokes
+    print(f"Canvas undo, {strokes} strokes of {points} points, {TILE}x{TILE} tiles")
+    print(f"history size {size / 2 ** 20:.2f} MB (full copy per step: {full_copy / 2 ** 20:.0f} MB), "
+          f"{len(history.undo_stack)} steps kept")
+    print(f"drawing {draw / strokes * 1000:.2f} ms/stroke, undo {undo / strokes * 1000:.3f} ms/step, "
+          f"redo {redo / strokes * 1000:.3f} ms/step")
+
+
+def resident_memory():
+    # Текущий, а не пиковый объем памяти процесса (Linux); иначе — пиковый
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_large_canvas(size=20000, view=(1280, 800), spots=8, strokes=20):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import QPointF
+    from PyQt6.QtWidgets import QApplication
+    from Smirnov import Canvas
+
+    app = QApplication.instance() or QApplication([])
+    baseline = resident_memory()
+    canvas = Canvas(size, size)
+    canvas.resize(*view)
+    canvas.show()
+    app.processEvents()
+    rng = random.Random(1)
+
+    def step(name, action):
+        start = time.perf_counter()
+        action()
+        canvas.repaint()
+        elapsed = time.perf_counter() - start
+        resident = sum(len(store.resident) for layer in canvas.layers for store in layer.levels)
+        print(f"{name:<34} {elapsed * 1000:9.1f} ms {(resident_memory() - baseline) / 2 ** 20:9.1f} MB "
+              f"{resident:8} {len(canvas.composite):7}")
+
+    def draw_at(x, y):
+        canvas.scale = 1.0
+        canvas.origin = QPointF(x - view[0] / 2, y - view[1] / 2)
+        for _ in range(strokes):
+            px, py = x + rng.uniform(-500, 500), y + rng.uniform(-300, 300)
+            canvas.begin_stroke(QPointF(px, py))
+            for _ in range(20):
+                px, py = px + rng.uniform(-20, 20), py + rng.uniform(-20, 20)
+                canvas.add_point(QPointF(px, py))
+            canvas.end_stroke()
+
+    print(f"Large canvas, {size}x{size} image in a {view[0]}x{view[1]} view "
+          f"(one full QImage would be {size * size * 4 / 2 ** 20:.0f} MB)")
+    print(f"{'step':<34} {'time':>12} {'memory':>12} {'tiles':>8} {'cached':>7}")
+    step("fit whole image", canvas.fit)
+    for i in range(spots):
+        x, y = rng.uniform(1000, size - 1000), rng.uniform(1000, size - 1000)
+        step(f"1:1 at ({x:.0f}, {y:.0f}), {strokes} strokes", lambda: draw_at(x, y))
+    step("fit again (mip levels rebuilt)", canvas.fit)
+    step("zoom to 25% around the center", lambda: canvas.zoom_at(0.25 / canvas.scale))
+    step("undo all strokes", lambda: [canvas.undo() for _ in range(spots * strokes)])
+    canvas.close()
+    canvas.deleteLater()
+    app.processEvents()
+
+
+BENCHMARKS = {
+    'connection-reuse': bench_connection_reuse,
+    'batch': bench_batch,
+    'language-detection': bench_language_detection,
+    'engine': bench_engine,
+    'canvas-stroke': bench_canvas_stroke,
+    'flood-fill': bench_flood_fill,
+    'canvas-undo': bench_canvas_undo,
+    'large-canvas': bench_large_canvas,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translator benchmarks: " + ", ".join(BENCHMARKS))
+    parser.add_argument('names', nargs='*', help="benchmarks to run (all by default)")
+    engine = parser.add_argument_group("engine benchmark")
+    engine.add_argument('--requests', type=int, default=1000)
+    engine.add_argument('--latency', type=float, default=0.005, help="simulated server latency, seconds")
+    engine.add_argument('--error-rate', type=float, default=0.05, help="share of failed server responses")
+    engine.add_argument('--repeat', type=float, default=0.5, help="share of requests repeating a phrase")
+    engine.add_argument('--seed', type=int, default=1)
+    engine.add_argument('--metrics-out', help="save metrics as JSON (*.json) or Prometheus text")
+    args = parser.parse_args()
+    for name in args.names or list(BENCHMARKS):
+        if name == 'engine':
+            bench_engine(args.requests, args.latency, args.error_rate, args.repeat, args.seed, args.metrics_out)
+        else:
+            BENCHMARKS[name]()
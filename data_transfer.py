@@ -0,0 +1,354 @@
+import codecs
+import csv
+import json
+import os
+
+from translator_core import guess_source_lang, decode_entry, read_lines_backwards
+
+FORMATS = {'.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}
+PHRASE_FIELDS = ['source_lang', 'target_lang', 'text', 'translation', 'updated']
+HISTORY_FIELDS = ['timestamp', 'time', 'original', 'translation', 'source', 'source_lang', 'target_lang']
+LANGUAGES = {'en', 'ru'}
+
+
+def detect_format(filename, default='json'):
+    return FORMATS.get(os.path.splitext(filename)[1].lower(), default)
+
+
+class JsonStreamReader:
+    WHITESPACE = ' \t\r\n'
+    NUMBER_TAIL = frozenset('0123456789.eE+-')
+
+    def __init__(self, f, chunk_size=1 << 20, max_record=64 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.max_record = max_record
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.fill()
+
+    def take(self, expected):
+        if self.peek() not in expected:
+            raise ValueError(f"ожидался один из символов {expected!r} в позиции {self.f.tell()}")
+        char = self.buffer[self.pos]
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                if len(self.buffer) - self.pos > self.max_record:
+                    raise ValueError("слишком большая запись")
+                self.fill()
+                continue
+            # Число могло оборваться на границе блока: "-7." разбирается как -7
+            if not self.eof and self.NUMBER_TAIL.issuperset(self.buffer[end:]):
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        opening = self.take('[{')
+        closing = ']' if opening == '[' else '}'
+        if self.peek() == closing:
+            return
+        while True:
+            if opening == '[':
+                yield self.value()
+            else:
+                key = self.value()
+                self.take(':')
+                yield key, self.value()
+            if self.take(',' + closing) == closing:
+                return
+
+
+def iter_lines(f):
+    for line in iter(f.readline, b''):
+        yield line.decode('utf-8-sig')
+
+
+def iter_records(f, fmt):
+    if fmt == 'json':
+        yield from JsonStreamReader(f).items()
+    elif fmt == 'jsonl':
+        for line in iter_lines(f):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    elif fmt == 'csv':
+        yield from csv.DictReader(iter_lines(f))
+    else:
+        raise ValueError(f"неизвестный формат: {fmt}")
+
+
+def phrase_row(record):
+    if isinstance(record, tuple):
+        record = {'text': record[0], 'translation': record[1]}
+    if not isinstance(record, dict):
+        return None
+    text, translation = record.get('text'), record.get('translation')
+    if not isinstance(text, str) or not isinstance(translation, str) or not text.strip() or not translation.strip():
+        return None
+    source_lang = record.get('source_lang') or guess_source_lang(text)
+    target_lang = record.get('target_lang') or ('en' if source_lang == 'ru' else 'ru')
+    if source_lang not in LANGUAGES or target_lang not in LANGUAGES or source_lang == target_lang:
+        return None
+    try:
+        updated = float(record.get('updated') or 0)
+    except (TypeError, ValueError):
+        return None
+    return source_lang, target_lang, text, translation, updated
+
+
+def history_entry(record):
+    if not isinstance(record, dict):
+        return None
+    original, translation = record.get('original'), record.get('translation')
+    if not isinstance(original, str) or not isinstance(translation, str) or not original.strip():
+        return None
+    entry = {
+        'timestamp': str(record.get('timestamp') or ''),
+        'original': original,
+        'translation': translation,
+        'source': str(record.get('source') or ''),
+    }
+    if record.get('time') not in (None, ''):
+        try:
+            entry['time'] = float(record['time'])
+        except (TypeError, ValueError):
+            return None
+    if record.get('source_lang') in LANGUAGES and record.get('target_lang') in LANGUAGES:
+        entry['source_lang'] = record['source_lang']
+        entry['target_lang'] = record['target_lang']
+    return entry
+
+
+def history_key(entry):
+    return hash((entry.get('time') or entry.get('timestamp'), entry.get('original'), entry.get('translation')))
+
+
+def new_result():
+    return {'read': 0, 'imported': 0, 'skipped': 0, 'invalid': 0, 'cancelled': False}
+
+
+def import_phrases(database, filename, fmt=None, strategy='overwrite', progress=None, cancelled=None,
+                   batch_size=5000):
+    result = new_result()
+    total = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        batch = []
+        for record in iter_records(f, fmt or detect_format(filename)):
+            # Прогресс и отмена считаются по прочитанным строкам, включая неверные
+            if result['read'] and result['read'] % batch_size == 0:
+                if cancelled is not None and cancelled():
+                    result['cancelled'] = True
+                    break
+                if progress is not None:
+                    progress(f.tell(), total)
+            result['read'] += 1
+            row = phrase_row(record)
+            if row is None:
+                result['invalid'] += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                result['imported'] += database.merge_rows(batch, strategy)
+                batch = []
+        else:
+            if batch:
+                result['imported'] += database.merge_rows(batch, strategy)
+    database.save_phrases()
+    if not result['cancelled']:
+        result['skipped'] = result['read'] - result['invalid'] - result['imported']
+    if progress is not None:
+        progress(total, total)
+    return result
+
+
+def staged_entries(staging_name, newest_first):
+    with open(staging_name, 'rb') as f:
+        if newest_first:
+            lines = (line for _, line in read_lines_backwards(f, os.path.getsize(staging_name)))
+        else:
+            lines = iter(f.readline, b'')
+        for line in lines:
+            entry = decode_entry(line)
+            if entry is not None:
+                yield entry
+
+
+def import_history(history, filename, fmt=None, strategy='skip', progress=None, cancelled=None,
+                   batch_size=5000):
+    if strategy not in ('skip', 'overwrite'):
+        raise ValueError(f"стратегия {strategy!r} не поддерживается для истории")
+    result = new_result()
+    total = os.path.getsize(filename)
+    fmt = fmt or detect_format(filename)
+    seen = set() if strategy == 'overwrite' else {history_key(entry) for entry in history.iter_entries()}
+    staging_name = history.filename + '.import'
+
+    try:
+        with open(filename, 'rb') as f, open(staging_name, 'wb') as staging:
+            for record in iter_records(f, fmt):
+                # Прогресс и отмена считаются по прочитанным строкам, включая неверные и повторы
+                if result['read'] and result['read'] % batch_size == 0:
+                    if cancelled is not None and cancelled():
+                        result['cancelled'] = True
+                        result['imported'] = 0
+                        return result
+                    if progress is not None:
+                        progress(f.tell(), total)
+                result['read'] += 1
+                entry = history_entry(record)
+                if entry is None:
+                    result['invalid'] += 1
+                    continue
+                key = history_key(entry)
+                if key in seen:
+                    continue
+                seen.add(key)
+                staging.write(history.encode(entry))
+                result['imported'] += 1
+        seen.clear()
+
+        # Старый формат JSON хранит записи от новых к старым, журнал - от старых к новым
+        entries = staged_entries(staging_name, newest_first=(fmt == 'json'))
+        if strategy == 'overwrite':
+            replacement_name = history.filename + '.replace'
+            with open(replacement_name, 'wb') as replacement:
+                for entry in entries:
+                    replacement.write(history.encode(entry))
+                replacement.flush()
+                os.fsync(replacement.fileno())
+            history.replace_with(replacement_name)
+        else:
+            batch = []
+            for entry in entries:
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    history.append_many(batch)
+                    batch = []
+            history.append_many(batch)
+        history.sync()
+    finally:
+        if os.path.exists(staging_name):
+            os.remove(staging_name)
+
+    result['skipped'] = result['read'] - result['invalid'] - result['imported']
+    if progress is not None:
+        progress(total, total)
+    return result
+
+
+def write_records(f, fmt, fields, records, progress=None, cancelled=None, total=0, every=5000):
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+    elif fmt == 'json':
+        f.write('[')
+    for i, record in enumerate(records):
+        if fmt == 'csv':
+            writer.writerow(record)
+        elif fmt == 'jsonl':
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            f.write((',\n    ' if i else '\n    ') + json.dumps(record, ensure_ascii=False))
+        if i % every == every - 1:
+            if cancelled is not None and cancelled():
+                return False
+            if progress is not None:
+                progress(i + 1, total)
+    if fmt == 'json':
+        f.write('\n]')
+    return True
+
+
+def finish_export(filename, completed, result, progress, total):
+    if not completed:
+        os.remove(filename)
+        result['cancelled'] = True
+    elif progress is not None:
+        progress(total, total)
+    return result
+
+
+def export_phrases(database, filename, fmt=None, progress=None, cancelled=None):
+    fmt = fmt or detect_format(filename)
+    total = database.storage.count()
+    result = new_result()
+    with open(filename, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'json':
+            # Старый формат: словарь "текст - перевод" без направления
+            f.write('{')
+            completed = True
+            for i, (_, _, text, translation) in enumerate(database.storage.items()):
+                f.write(',\n    ' if i else '\n    ')
+                f.write(json.dumps(text, ensure_ascii=False) + ': ' + json.dumps(translation, ensure_ascii=False))
+                result['read'] += 1
+                if i % 5000 == 4999:
+                    if cancelled is not None and cancelled():
+                        completed = False
+                        break
+                    if progress is not None:
+                        progress(i + 1, total)
+            f.write('\n}')
+        else:
+            records = (dict(zip(PHRASE_FIELDS, row)) for row in database.storage.records())
+            completed = write_records(f, fmt, PHRASE_FIELDS, records, progress, cancelled, total)
+            result['read'] = total
+    return finish_export(filename, completed, result, progress, total)
+
+
+def count_lines(filename, chunk_size=1 << 20):
+    # Одна запись журнала - одна строка; счет по блокам без разбора JSON
+    count = 0
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            count += chunk.count(b'\n')
+    return count
+
+
+def export_history(history, filename, fmt=None, progress=None, cancelled=None):
+    fmt = fmt or detect_format(filename)
+    # Прогресс считается в записях, поэтому и итог - число записей, а не размер журнала
+    history.sync()
+    total = count_lines(history.filename)
+    result = new_result()
+    if fmt == 'json':
+        records = history.iter_entries()
+    else:
+        records = staged_entries(history.filename, newest_first=False)
+    with open(filename, 'w', encoding='utf-8', newline='') as f:
+        completed = write_records(f, fmt, HISTORY_FIELDS, counted(records, result), progress, cancelled, total)
+    return finish_export(filename, completed, result, progress, total)
+
+
+def counted(records, result):
+    for record in records:
+        result['read'] += 1
+        yield record
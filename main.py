@@ -1,124 +1,169 @@
 import sys
-import json
-import os
-import requests
+import threading
+import time
+from contextlib import contextmanager
+
+STARTED = time.perf_counter()
+
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QLineEdit, QPushButton, QTextEdit, QMessageBox, QTabWidget,
-    QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QDialog, QGroupBox
+    QTableView, QHeaderView, QFileDialog, QDialog, QGroupBox, QCheckBox, QCompleter, QTreeView,
+    QProgressDialog, QInputDialog, QTableWidget, QTableWidgetItem
 )
-from PyQt6.QtCore import Qt, QDateTime
-from PyQt6.QtGui import QAction, QIcon, QShortcut, QKeySequence
-
-
-class TextTranslator:
-    @staticmethod
-    def translate(text, target_lang):
+from PyQt6.QtCore import (
+    Qt, QObject, QRunnable, QThreadPool, QTimer, QEvent, pyqtSignal, QAbstractTableModel, QModelIndex
+)
+from PyQt6.QtGui import QAction, QIcon, QShortcut, QKeySequence, QStandardItemModel, QStandardItem
+
+from telemetry import metrics
+from translator_core import normalize_text, detect_direction, detect_language
+
+TRANSFER_FILTER = "JSON Files (*.json);;JSON Lines (*.jsonl);;CSV Files (*.csv);;All Files (*)"
+PHRASE_STRATEGIES = {
+    "Заменять существующие": 'overwrite',
+    "Пропускать существующие": 'skip',
+    "Оставлять более новые": 'newest',
+}
+HISTORY_STRATEGIES = {
+    "Добавить к текущей истории": 'skip',
+    "Заменить текущую историю": 'overwrite',
+}
+LANGUAGE_NAMES = {'en': "английском", 'ru': "русском"}
+STATS_FORMATS = {"JSON (*.json)": 'json', "Prometheus (*.prom *.txt)": 'prometheus'}
+
+
+class StartupProfiler(QObject):
+    # Испускается, когда окно отрисовано и данные загружены
+    completed = pyqtSignal()
+
+    def __init__(self, enabled=False, parent=None):
+        super().__init__(parent)
+        self.enabled = enabled
+        self.phases = []
+        self.lock = threading.Lock()
+        self.shown = None
+        self.waiting = {'paint', 'data'}
+
+    def record(self, name, start, end):
+        with self.lock:
+            self.phases.append((start - STARTED, end - start, name))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
         try:
-            source_lang = 'ru' if target_lang == 'en' else 'en'
-            params = {
-                'client': 'gtx',
-                'sl': source_lang,
-                'tl': target_lang,
-                'dt': 't',
-                'q': text
-            }
-            response = requests.get(
-                "https://translate.googleapis.com/translate_a/single",
-                params=params,
-                timeout=5
-            )
-            return response.json()[0][0][0]
-        except Exception as e:
-            print("Ошибка при переводе:", e)
-            return None
-
-
-class PhraseDatabase:
-    def __init__(self):
-        self.phrases = {}
-        self.load_phrases()
-
-    def load_phrases(self):
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def reached(self, milestone):
+        self.waiting.discard(milestone)
+        if not self.waiting:
+            self.completed.emit()
+
+    def watch_paint(self, window):
+        self.shown = time.perf_counter()
+        window.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint and 'paint' in self.waiting:
+            obj.removeEventFilter(self)
+            self.record("первая отрисовка окна", self.shown, time.perf_counter())
+            self.reached('paint')
+        return False
+
+    def report(self, file=sys.stderr):
+        print("Профиль запуска (мс от начала выполнения main.py):", file=file)
+        print(f"{'начало':>9} {'длит.':>9}  этап", file=file)
+        for start, duration, name in sorted(self.phases):
+            print(f"{start * 1000:9.1f} {duration * 1000:9.1f}  {name}", file=file)
+        paint = [start + duration for start, duration, name in self.phases if name == "первая отрисовка окна"]
+        if paint:
+            print(f"Время до первой отрисовки: {paint[0] * 1000:.1f} мс", file=file)
+
+
+class TranslationTask(QRunnable):
+    def __init__(self, engine, key):
+        super().__init__()
+        self.engine = engine
+        self.key = key
+        # Задачу удаляет не пул, а AsyncTranslator, когда убирает ее из tasks: иначе cancel
+        # может вызвать tryTake для задачи, которую пул уже удалил после run()
+        self.setAutoDelete(False)
+
+    def run(self):
+        text, target_lang = self.key
+        # Ответ отправляется всегда: иначе ключ навсегда остается в tasks и waiters
         try:
-            if os.path.exists('phrases.json'):
-                with open('phrases.json', 'r', encoding='utf-8') as f:
-                    self.phrases = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.phrases = {}
-
-    def save_phrases(self):
-        with open('phrases.json', 'w', encoding='utf-8') as f:
-            json.dump(self.phrases, f, ensure_ascii=False, indent=4)
+            translation, provider = self.engine.providers.translate_with_source(text, target_lang)
+        except Exception:
+            translation, provider = None, ''
+        self.engine.task_finished.emit(self.key, (translation, provider or ''))
 
-    def get_phrase(self, text):
-        return self.phrases.get(text, None)
 
-    def add_phrase(self, text, translation):
-        self.phrases[text] = translation
+class AsyncTranslator(QObject):
+    # request_id, text, target_lang, translation (None при ошибке), имя поставщика
+    translated = pyqtSignal(int, str, str, object, str)
+    task_finished = pyqtSignal(object, object)
 
-    def import_phrases(self, filename):
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                imported = json.load(f)
-                self.phrases.update(imported)
-                return True
-        except Exception:
-            return False
-
-    def export_phrases(self, filename):
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.phrases, f, ensure_ascii=False, indent=4)
-                return True
-        except Exception:
-            return False
+    def __init__(self, providers, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.providers = providers
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.tasks = {}
+        self.waiters = {}
+        self.latest = {}
+        self.next_id = 0
+        self.task_finished.connect(self.on_task_finished)
+
+    def request(self, text, target_lang, owner=None):
+        self.next_id += 1
+        request_id = self.next_id
+        if owner is not None:
+            self.cancel(self.latest.get(owner))
+            self.latest[owner] = request_id
+
+        key = (text, target_lang)
+        if key in self.waiters:
+            self.waiters[key].append(request_id)
+            return request_id
+
+        self.waiters[key] = [request_id]
+        task = TranslationTask(self, key)
+        self.tasks[key] = task
+        self.pool.start(task)
+        return request_id
+
+    def cancel(self, request_id):
+        if request_id is None:
+            return
+        for key, ids in self.waiters.items():
+            if request_id in ids:
+                ids.remove(request_id)
+                if not ids and self.pool.tryTake(self.tasks[key]):
+                    del self.waiters[key]
+                    del self.tasks[key]
+                return
 
+    def cancel_owner(self, owner):
+        self.cancel(self.latest.pop(owner, None))
 
-class TranslationHistory:
-    def __init__(self):
-        self.entries = []
-        self.load_history()
+    def pending(self):
+        return sum(len(ids) for ids in self.waiters.values())
 
-    def load_history(self):
-        try:
-            if os.path.exists('history.json'):
-                with open('history.json', 'r', encoding='utf-8') as f:
-                    self.entries = json.load(f)
-                    self.entries = self.entries[:50]
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.entries = []
-
-    def save_history(self):
-        with open('history.json', 'w', encoding='utf-8') as f:
-            json.dump(self.entries, f, ensure_ascii=False, indent=4)
-
-    def add_entry(self, original, translation, source):
-        entry = {
-            'timestamp': QDateTime.currentDateTime().toString("dd.MM.yyyy HH:mm:ss"),
-            'original': original,
-            'translation': translation,
-            'source': source
-        }
-        self.entries.insert(0, entry)
-        self.entries = self.entries[:50]
-
-    def import_history(self, filename):
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                imported = json.load(f)
-                self.entries = imported[:50]
-                return True
-        except Exception:
-            return False
+    def on_task_finished(self, key, result):
+        self.tasks.pop(key, None)
+        text, target_lang = key
+        translation, provider = result
+        for request_id in self.waiters.pop(key, []):
+            self.translated.emit(request_id, text, target_lang, translation, provider)
 
-    def export_history(self, filename):
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.entries, f, ensure_ascii=False, indent=4)
-                return True
-        except Exception:
-            return False
+    def shutdown(self):
+        self.pool.clear()
+        self.waiters.clear()
+        self.tasks.clear()
 
 
 class HotkeysDialog(QDialog):
@@ -154,14 +199,121 @@ class HotkeysDialog(QDialog):
         self.setLayout(layout)
 
 
+class StatsDialog(QDialog):
+    HEADERS = ["Метрика", "Вызовы", "p50, мс", "p95, мс", "p99, мс", "Значение"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Статистика")
+        self.resize(640, 420)
+
+        layout = QVBoxLayout()
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        export_btn = QPushButton("Экспорт...")
+        reset_btn = QPushButton("Сбросить")
+        close_btn = QPushButton("Закрыть")
+        btn_layout.addWidget(export_btn)
+        btn_layout.addWidget(reset_btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+        export_btn.clicked.connect(self.export)
+        reset_btn.clicked.connect(self.reset)
+        close_btn.clicked.connect(self.close)
+
+        # Пока окно открыто, значения обновляются раз в секунду
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        snapshot = metrics.snapshot()
+        rows = []
+        for name, timer in snapshot['timers'].items():
+            rows.append([name, str(timer['count'])] + [
+                f"{timer[q] * 1000:.2f}" if timer[q] is not None else '' for q in ('p50', 'p95', 'p99')
+            ] + [''])
+        for name, value in {**snapshot['counters'], **snapshot['gauges']}.items():
+            text = f"{value:.3f}" if isinstance(value, float) else str(value)
+            rows.append([name, '', '', '', '', text])
+
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def export(self):
+        filename, selected = QFileDialog.getSaveFileName(self, "Экспорт статистики", "", ";;".join(STATS_FORMATS))
+        if not filename:
+            return
+        fmt = STATS_FORMATS.get(selected) or ('json' if filename.endswith('.json') else 'prometheus')
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(metrics.to_json() if fmt == 'json' else metrics.to_prometheus())
+        except OSError as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить статистику: {e}")
+
+
 class TranslationTab(QWidget):
-    def __init__(self, translator, database, history):
+    LOADING_LABEL = "Источник перевода: загрузка локальной базы..."
+
+    def __init__(self, engine):
         super().__init__()
-        self.translator = translator
-        self.database = database
-        self.history = history
+        self.engine = engine
+        # Данные подключаются через attach() после фоновой загрузки
+        self.cache = None
+        self.history = None
+        self.index = None
+        self.memory = None
+        self.deferred_target = None
+        self.pending_request = None
+        self.pending_started = None
+        self.live_target = 'en'
+        self.live_requests = {}
+        self.live_queued = set()
         self.setup_ui()
         self.setup_hotkeys()
+        self.engine.translated.connect(self.on_translated)
+
+    def attach(self, cache, history, index, memory):
+        self.cache = cache
+        self.history = history
+        self.index = index
+        self.memory = memory
+        if self.source_label.text() == self.LOADING_LABEL:
+            self.source_label.setText("Источник перевода: ")
+        if self.deferred_target is not None:
+            target_lang, self.deferred_target = self.deferred_target, None
+            self.translate_text(target_lang)
+        else:
+            self.on_live_text_changed(self.input_field.text())
+        self.update_suggestions(self.input_field.text())
 
     def setup_hotkeys(self):
         QShortcut(QKeySequence("Ctrl+E"), self).activated.connect(lambda: self.translate_text('en'))
@@ -198,6 +350,25 @@ class TranslationTab(QWidget):
         btn_layout.addWidget(self.btn_to_russian)
         btn_layout.addWidget(self.btn_hotkeys)
 
+        options_layout = QHBoxLayout()
+        self.suggest_checkbox = QCheckBox("Подсказки из базы")
+        self.live_checkbox = QCheckBox("Перевод при вводе")
+        options_layout.addWidget(self.suggest_checkbox)
+        options_layout.addWidget(self.live_checkbox)
+        options_layout.addStretch()
+
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(300)
+        self.suggestions = QStandardItemModel(self)
+        self.completer = QCompleter(self.suggestions, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        popup = QTreeView()
+        popup.setHeaderHidden(True)
+        popup.setRootIsDecorated(False)
+        self.completer.setPopup(popup)
+        popup.header().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+
         self.output_field = QTextEdit()
         self.output_field.setReadOnly(True)
         self.output_field.setPlaceholderText("Результат перевода (Ctrl+Shift+C - копировать)")
@@ -206,6 +377,7 @@ class TranslationTab(QWidget):
 
         layout.addWidget(QLabel("Исходный текст:"))
         layout.addWidget(self.input_field)
+        layout.addLayout(options_layout)
         layout.addLayout(btn_layout)
         layout.addWidget(QLabel("Результат:"))
         layout.addWidget(self.output_field)
@@ -216,53 +388,252 @@ class TranslationTab(QWidget):
         self.btn_to_english.clicked.connect(lambda: self.translate_text('en'))
         self.btn_to_russian.clicked.connect(lambda: self.translate_text('ru'))
         self.btn_hotkeys.clicked.connect(self.show_hotkeys)
+        self.input_field.textChanged.connect(self.cancel_pending)
+        self.input_field.textEdited.connect(self.update_suggestions)
+        self.suggest_checkbox.toggled.connect(self.toggle_suggestions)
+        self.input_field.textChanged.connect(self.on_live_text_changed)
+        self.live_checkbox.toggled.connect(lambda: self.on_live_text_changed(self.input_field.text()))
+        self.live_timer.timeout.connect(self.live_translate)
+
+    def toggle_suggestions(self, enabled):
+        self.input_field.setCompleter(self.completer if enabled else None)
+        if enabled:
+            self.update_suggestions(self.input_field.text())
+
+    def update_suggestions(self, text):
+        if not self.suggest_checkbox.isChecked() or self.index is None:
+            return
+        self.suggestions.clear()
+        for phrase, translation, _, _ in self.index.suggest(text):
+            self.suggestions.appendRow([QStandardItem(phrase), QStandardItem(translation)])
+        if self.suggestions.rowCount():
+            self.completer.complete()
+
+    def show_live_translation(self, translation, source):
+        self.output_field.setPlainText(translation)
+        self.source_label.setText(f"Источник перевода: {source}")
+
+    def on_live_text_changed(self, text):
+        if not self.live_checkbox.isChecked() or self.cache is None:
+            self.live_timer.stop()
+            return
+        text = text.strip()
+        if not text:
+            self.live_timer.stop()
+            self.output_field.clear()
+            return
+        if detect_language(text) is not None:
+            self.live_target = detect_direction(text)[1]
+        translation = self.cache.get(text, self.live_target)
+        if translation:
+            self.live_timer.stop()
+            self.show_live_translation(translation, "локальная база")
+        else:
+            self.live_timer.start()
+
+    def live_translate(self):
+        text = self.input_field.text().strip()
+        target_lang = self.live_target
+        if not text or not self.live_checkbox.isChecked():
+            return
+        translation = self.cache.get(text, target_lang)
+        if translation:
+            self.show_live_translation(translation, "локальная база")
+            return
+        if target_lang in self.live_requests:
+            self.live_queued.add(target_lang)
+            return
+        self.live_requests[target_lang] = self.engine.request(text, target_lang)
+        self.source_label.setText("Источник перевода: выполняется запрос...")
+
+    def on_live_translated(self, text, target_lang, translation, provider):
+        del self.live_requests[target_lang]
+        if translation:
+            if provider == 'online':
+                self.cache.put(text, target_lang, translation)
+            current = self.input_field.text().strip()
+            if target_lang == self.live_target and normalize_text(current) == normalize_text(text):
+                self.show_live_translation(translation, self.provider_label(provider))
+        if target_lang in self.live_queued:
+            self.live_queued.discard(target_lang)
+            self.live_translate()
+
+    def cancel_pending(self):
+        if self.pending_request is not None:
+            self.engine.cancel_owner(self)
+            self.pending_request = None
+            self.source_label.setText("Источник перевода: ")
 
     def translate_text(self, target_lang):
+        started = time.perf_counter()
+        self.live_target = target_lang
         text = self.input_field.text().strip()
         if not text:
             QMessageBox.warning(self, "Ошибка", "Введите текст для перевода")
             return
 
-        translation = self.database.get_phrase(text)
+        if detect_direction(text, target_lang)[0] == target_lang:
+            self.cancel_pending()
+            self.output_field.setPlainText(text)
+            self.source_label.setText(f"Источник перевода: текст уже на {LANGUAGE_NAMES[target_lang]} языке")
+            return
+
+        if self.cache is None:
+            # Перевод выполнится, как только загрузится локальная база
+            self.deferred_target = target_lang
+            self.source_label.setText(self.LOADING_LABEL)
+            return
+
+        translation = self.cache.get(text, target_lang)
         if translation:
             self.output_field.setPlainText(translation)
             self.source_label.setText("Источник перевода: локальная база")
-            self.history.add_entry(text, translation, "local")
+            self.history.add_entry(text, translation, "local", *detect_direction(text, target_lang))
             self.history.save_history()
+            metrics.observe('ui.translate', time.perf_counter() - started)
+            return
+
+        self.pending_started = started
+        self.pending_request = self.engine.request(text, target_lang, owner=self)
+        self.source_label.setText("Источник перевода: выполняется запрос...")
+
+    def provider_label(self, provider):
+        found = self.engine.providers.get(provider)
+        return found.label if found is not None else provider
+
+    def on_translated(self, request_id, text, target_lang, translation, provider):
+        if self.live_requests.get(target_lang) == request_id:
+            self.on_live_translated(text, target_lang, translation, provider)
+            return
+        if request_id != self.pending_request:
             return
+        self.pending_request = None
+        # Время от нажатия до показа результата, без диалога сохранения
+        metrics.observe('ui.translate', time.perf_counter() - self.pending_started)
 
-        translation = self.translator.translate(text, target_lang)
         if translation:
             self.output_field.setPlainText(translation)
-            self.source_label.setText("Источник перевода: онлайн-сервис")
-            self.history.add_entry(text, translation, "online")
+            self.source_label.setText(f"Источник перевода: {self.provider_label(provider)}")
+            self.history.add_entry(text, translation, provider, *detect_direction(text, target_lang))
             self.history.save_history()
+            if provider != 'online':
+                return
 
+            self.cache.put(text, target_lang, translation)
             if QMessageBox.question(
                 self, "Сохранение",
                 "Сохранить перевод в локальную базу?",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
             ) == QMessageBox.StandardButton.Yes:
-                self.database.add_phrase(text, translation)
-                self.database.save_phrases()
+                self.cache.put(text, target_lang, translation, persist=True)
+                self.memory.commit(text, target_lang)
         else:
+            self.source_label.setText("Источник перевода: ")
             QMessageBox.critical(self, "Ошибка", "Не удалось выполнить перевод")
+
+
+class HistoryTableModel(QAbstractTableModel):
+    HEADERS = ["Дата и время", "Оригинал", "Перевод", "Источник", "Направление"]
+    FIELDS = ['timestamp', 'original', 'translation', 'source', 'direction']
+    SOURCE_COLORS = {
+        "local": Qt.GlobalColor.darkGreen,
+        "online": Qt.GlobalColor.blue,
+        "offline": Qt.GlobalColor.darkYellow,
+    }
+
+    def __init__(self, history, batch_size=500, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.batch_size = batch_size
+        self.rows = len(history.entries)
+        self.results = None
+        history.subscribe(self.on_history_changed)
+
+    def entry(self, row):
+        if self.results is not None:
+            return self.results[row]
+        entries = self.history.entries
+        return entries[len(entries) - 1 - row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.FIELDS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self.rows:
+            return None
+        entry = self.entry(index.row())
+        field = self.FIELDS[index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if field == 'direction':
+                return f"{entry['source_lang']} → {entry['target_lang']}" if 'source_lang' in entry else ''
+            return entry.get(field, '')
+        if role == Qt.ItemDataRole.ForegroundRole and field == 'source':
+            return self.SOURCE_COLORS.get(entry.get('source'))
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.results is not None:
+            return False
+        return self.rows < len(self.history.entries) or self.history.can_load_more()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.results is not None:
+            return
+        if self.rows >= len(self.history.entries):
+            self.history.load_more(self.batch_size)
+        count = len(self.history.entries) - self.rows
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.rows, self.rows + count - 1)
+        self.rows += count
+        self.endInsertRows()
+
+    def on_history_changed(self, event, entry):
+        if event == 'added' and self.results is None:
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            self.rows += 1
+            self.endInsertRows()
+        elif event == 'reset':
+            self.reload()
+
+    def set_results(self, results):
+        self.beginResetModel()
+        self.results = results
+        self.rows = len(results) if results is not None else len(self.history.entries)
+        self.endResetModel()
+
+    def reload(self):
+        self.set_results(None)
+
+
 class HistoryTab(QWidget):
-    def __init__(self, history):
+    def __init__(self, history, index):
         super().__init__()
         self.history = history
+        self.index = index
         self.setup_ui()
 
     def setup_ui(self):
         layout = QVBoxLayout()
 
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(4)
-        self.history_table.setHorizontalHeaderLabels(
-            ["Дата и время", "Оригинал", "Перевод", "Источник"]
-        )
+        self.search_field = QLineEdit()
+        self.search_field.setPlaceholderText("Поиск по истории...")
+        self.search_field.setClearButtonEnabled(True)
+
+        self.history_model = HistoryTableModel(self.history, parent=self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.history_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.history_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.history_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
 
         btn_layout = QHBoxLayout()
         self.clear_btn = QPushButton("Очистить историю")
@@ -270,32 +641,23 @@ class HistoryTab(QWidget):
         btn_layout.addWidget(self.clear_btn)
         btn_layout.addWidget(self.export_btn)
 
+        layout.addWidget(self.search_field)
         layout.addWidget(self.history_table)
         layout.addLayout(btn_layout)
         self.setLayout(layout)
 
         self.clear_btn.clicked.connect(self.clear_history)
-        self.export_btn.clicked.connect(self.export_history)
+        self.search_field.textChanged.connect(self.search_history)
 
-        self.update_history_table()
+    def search_history(self, query):
+        if query.strip():
+            self.history_model.set_results(self.index.search_history(query))
+        else:
+            self.history_model.reload()
 
     def update_history_table(self):
-        self.history_table.setRowCount(len(self.history.entries))
-        for row, entry in enumerate(self.history.entries):
-            timestamp = entry.get('timestamp', '')
-            original = entry.get('original', '')
-            translation = entry.get('translation', '')
-            source = entry.get('source', '')
-
-            self.history_table.setItem(row, 0, QTableWidgetItem(timestamp))
-            self.history_table.setItem(row, 1, QTableWidgetItem(original))
-            self.history_table.setItem(row, 2, QTableWidgetItem(translation))
-            item = QTableWidgetItem(source)
-            if source == "local":
-                item.setForeground(Qt.GlobalColor.darkGreen)
-            elif source == "online":
-                item.setForeground(Qt.GlobalColor.blue)
-            self.history_table.setItem(row, 3, item)
+        self.search_field.clear()
+        self.history_model.reload()
 
     def clear_history(self):
         if QMessageBox.question(
@@ -303,34 +665,71 @@ class HistoryTab(QWidget):
             "Вы уверены, что хотите очистить историю переводов?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         ) == QMessageBox.StandardButton.Yes:
-            self.history.entries = []
-            self.history.save_history()
-            self.update_history_table()
+            self.history.clear()
 
-    def export_history(self):
-        filename, _ = QFileDialog.getSaveFileName(
-            self, "Экспорт истории переводов", "", "JSON Files (*.json);;All Files (*)"
-        )
-        if filename:
-            if self.history.export_history(filename):
-                QMessageBox.information(self, "Успех", "История успешно экспортирована")
-            else:
-                QMessageBox.critical(self, "Ошибка", "Не удалось экспортировать историю")
+
+class TransferSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+
+
+class TransferTask(QRunnable):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.cancelled = False
+        self.signals = TransferSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, done, total):
+        self.signals.progress.emit(int(done * 1000 / total) if total else 1000)
+
+    def run(self):
+        try:
+            result = self.job(self.report, lambda: self.cancelled)
+        except Exception as e:
+            result = {'error': str(e)}
+        self.signals.finished.emit(result)
 
 
 class MainApplication(QMainWindow):
-    def __init__(self):
+    def __init__(self, profiler=None):
         super().__init__()
+        self.profiler = profiler if profiler is not None else StartupProfiler(parent=self)
         self.setWindowIcon(QIcon('icons/ik.png'))
         self.setWindowTitle("Языковой помощник")
         self.setFixedSize(900, 500)
-        self.translator = TextTranslator()
-        self.database = PhraseDatabase()
-        self.history = TranslationHistory()
-
-        self.setup_interface()
-        self.create_menu()
-
+        # База фраз, история и поставщики открываются в фоне после показа окна
+        self.translator = None
+        self.database = None
+        self.cache = None
+        self.history = None
+        self.index = None
+        self.memory = None
+        self.providers = None
+        self.prefetcher = None
+        self.loader = None
+        self.engine = AsyncTranslator(None, parent=self)
+        self.transfer = None
+        self.history_tab = None
+        self.stats_dialog = None
+        # Изменения, сделанные другими экземплярами приложения и утилитами
+        self.sync_timer = QTimer(self)
+        self.sync_timer.setInterval(1000)
+        self.sync_timer.timeout.connect(self.sync_shared)
+
+        with self.profiler.phase("создание виджетов"):
+            self.setup_interface()
+            self.create_menu()
+
+        with self.profiler.phase("таблица стилей"):
+            self.apply_style()
+
+        QTimer.singleShot(0, self.start_loading)
+
+    def apply_style(self):
         self.setStyleSheet("""
             QWidget {
                 font-family: Segoe UI, sans-serif;
@@ -366,13 +765,13 @@ class MainApplication(QMainWindow):
                 padding: 6px;
                 border: none;
             }
-            QTableWidget {
+            QTableView {
                 border: 1px solid #444;
                 gridline-color: #555;
                 background-color: #2b2b2b;
                 alternate-background-color: #333;
             }
-            QTableWidget QTableCornerButton::section {
+            QTableView QTableCornerButton::section {
                 background-color: #444;
             }
             QMenuBar {
@@ -410,14 +809,78 @@ class MainApplication(QMainWindow):
     def setup_interface(self):
         self.tabs = QTabWidget()
 
-        self.translate_tab = TranslationTab(self.translator, self.database, self.history)
+        self.translate_tab = TranslationTab(self.engine)
         self.tabs.addTab(self.translate_tab, "Переводчик")
 
-        self.history_tab = HistoryTab(self.history)
-        self.tabs.addTab(self.history_tab, "История")
+        # Вкладка истории строится при первом показе
+        self.history_page = QWidget()
+        history_layout = QVBoxLayout(self.history_page)
+        history_layout.setContentsMargins(0, 0, 0, 0)
+        self.tabs.addTab(self.history_page, "История")
+        self.tabs.currentChanged.connect(self.ensure_history_tab)
 
         self.setCentralWidget(self.tabs)
 
+    def ensure_history_tab(self):
+        if self.history_tab is not None or self.history is None:
+            return
+        if self.tabs.currentWidget() is not self.history_page:
+            return
+        with self.profiler.phase("вкладка истории"):
+            self.history_tab = HistoryTab(self.history, self.index)
+            self.history_tab.export_btn.clicked.connect(self.export_history)
+            self.history_page.layout().addWidget(self.history_tab)
+
+    def start_loading(self):
+        self.loader = TransferTask(lambda progress, cancelled: self.load_data())
+        self.loader.signals.finished.connect(self.on_data_loaded)
+        QThreadPool.globalInstance().start(self.loader)
+
+    def load_data(self):
+        with self.profiler.phase("импорт модулей данных"):
+            from prefetch import Prefetcher
+            from providers import ProviderRegistry, OnlineProvider, OfflineProvider
+            from translation_memory import TranslationMemory
+            from translator_core import (
+                TextTranslator, PhraseDatabase, TranslationCache, TranslationHistory, SearchIndex
+            )
+        with self.profiler.phase("открытие базы фраз"):
+            self.translator = TextTranslator()
+            self.database = PhraseDatabase()
+            self.cache = TranslationCache(self.database)
+        with self.profiler.phase("загрузка истории"):
+            self.history = TranslationHistory()
+        with self.profiler.phase("поисковый индекс"):
+            self.index = SearchIndex(self.database, self.history)
+        with self.profiler.phase("поставщики перевода"):
+            self.memory = TranslationMemory(self.translator, self.cache, self.index)
+            self.providers = ProviderRegistry()
+            self.providers.register(OnlineProvider(self.translator, self.memory))
+            self.providers.register(OfflineProvider(self.database))
+            self.prefetcher = Prefetcher(self.translator, self.cache, self.history, self.database,
+                                         busy=lambda: bool(self.engine.tasks) or self.transfer is not None)
+        metrics.register('cache', self.cache.stats)
+        metrics.register('memory', self.memory.stats)
+        metrics.register('providers', self.providers.stats)
+        metrics.register('prefetch', self.prefetcher.stats)
+        return {}
+
+    def on_data_loaded(self, result):
+        self.loader = None
+        if 'error' in result:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить локальные данные: {result['error']}")
+            return
+        self.engine.providers = self.providers
+        self.translate_tab.attach(self.cache, self.history, self.index, self.memory)
+        self.ensure_history_tab()
+        self.sync_timer.start()
+        self.prefetcher.start()
+        self.profiler.reached('data')
+
+    def sync_shared(self):
+        self.history.refresh()
+        self.cache.refresh()
+
     def create_menu(self):
         menubar = self.menuBar()
         file_menu = menubar.addMenu("Файл")
@@ -446,47 +909,174 @@ class MainApplication(QMainWindow):
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
+        tools_menu = menubar.addMenu("Сервис")
+        stats_action = QAction("Статистика...", self)
+        stats_action.triggered.connect(self.show_stats)
+        tools_menu.addAction(stats_action)
+
+        self.clipboard_action = QAction("Предзагружать перевод из буфера обмена", self)
+        self.clipboard_action.setCheckable(True)
+        tools_menu.addAction(self.clipboard_action)
+        QApplication.clipboard().dataChanged.connect(self.prefetch_clipboard)
+
+    def prefetch_clipboard(self):
+        if not self.clipboard_action.isChecked() or self.prefetcher is None:
+            return
+        text = QApplication.clipboard().text()
+        if 0 < len(text) <= 500:
+            self.prefetcher.enqueue(text)
+
+    def show_stats(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = StatsDialog(self)
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
+
+    def run_transfer(self, title, job, on_finished):
+        if self.transfer is not None:
+            QMessageBox.warning(self, "Ошибка", "Дождитесь завершения текущей операции")
+            return
+        if self.cache is None:
+            QMessageBox.warning(self, "Ошибка", "Локальные данные еще не загружены")
+            return
+        dialog = QProgressDialog(title, "Отмена", 0, 1000, self)
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.setMinimumDuration(300)
+
+        self.transfer = TransferTask(job)
+        self.transfer.signals.progress.connect(dialog.setValue)
+        dialog.canceled.connect(self.transfer.cancel)
+
+        def finished(result):
+            self.transfer = None
+            dialog.close()
+            on_finished(result)
+
+        self.transfer.signals.finished.connect(finished)
+        QThreadPool.globalInstance().start(self.transfer)
+
+    def report_transfer(self, result, done_message, error_message):
+        if 'error' in result:
+            QMessageBox.critical(self, "Ошибка", f"{error_message}: {result['error']}")
+        elif result['cancelled']:
+            QMessageBox.information(self, "Отменено", "Операция отменена")
+        elif result.get('imported') or result.get('skipped') or result.get('invalid'):
+            QMessageBox.information(
+                self, "Успех",
+                f"{done_message}\nДобавлено: {result['imported']}, пропущено: {result['skipped']}, "
+                f"с ошибками: {result['invalid']}"
+            )
+        else:
+            QMessageBox.information(self, "Успех", done_message)
+
+    def choose_strategy(self, title, strategies):
+        labels = list(strategies)
+        label, ok = QInputDialog.getItem(self, title, "Совпадающие записи:", labels, 0, False)
+        return strategies[label] if ok else None
+
     def import_phrases(self):
-        filename, _ = QFileDialog.getOpenFileName(self, "Импорт фраз", "", "JSON Files (*.json);;All Files (*)")
-        if filename:
-            if self.database.import_phrases(filename):
-                QMessageBox.information(self, "Успех", "Фразы успешно импортированы")
-            else:
-                QMessageBox.critical(self, "Ошибка", "Не удалось импортировать фразы")
+        import data_transfer
+        filename, _ = QFileDialog.getOpenFileName(self, "Импорт фраз", "", TRANSFER_FILTER)
+        if not filename:
+            return
+        strategy = self.choose_strategy("Импорт фраз", PHRASE_STRATEGIES)
+        if strategy is None:
+            return
+
+        def finished(result):
+            self.cache.clear()
+            self.report_transfer(result, "Фразы успешно импортированы", "Не удалось импортировать фразы")
+
+        self.run_transfer(
+            "Импорт фраз...",
+            lambda progress, cancelled: data_transfer.import_phrases(
+                self.database, filename, strategy=strategy, progress=progress, cancelled=cancelled
+            ),
+            finished
+        )
 
     def export_phrases(self):
-        filename, _ = QFileDialog.getSaveFileName(self, "Экспорт фраз", "", "JSON Files (*.json);;All Files (*)")
+        import data_transfer
+        filename, _ = QFileDialog.getSaveFileName(self, "Экспорт фраз", "", TRANSFER_FILTER)
         if filename:
-            if self.database.export_phrases(filename):
-                QMessageBox.information(self, "Успех", "Фразы успешно экспортированы")
-            else:
-                QMessageBox.critical(self, "Ошибка", "Не удалось экспортировать фразы")
+            self.run_transfer(
+                "Экспорт фраз...",
+                lambda progress, cancelled: data_transfer.export_phrases(
+                    self.database, filename, progress=progress, cancelled=cancelled
+                ),
+                lambda result: self.report_transfer(
+                    result, "Фразы успешно экспортированы", "Не удалось экспортировать фразы"
+                )
+            )
 
     def import_history(self):
-        filename, _ = QFileDialog.getOpenFileName(self, "Импорт истории", "", "JSON Files (*.json);;All Files (*)")
-        if filename:
-            if self.history.import_history(filename):
+        import data_transfer
+        filename, _ = QFileDialog.getOpenFileName(self, "Импорт истории", "", TRANSFER_FILTER)
+        if not filename:
+            return
+        strategy = self.choose_strategy("Импорт истории", HISTORY_STRATEGIES)
+        if strategy is None:
+            return
+
+        def finished(result):
+            self.history.reload()
+            if self.history_tab is not None:
                 self.history_tab.update_history_table()
-                QMessageBox.information(self, "Успех", "История успешно импортирована")
-            else:
-                QMessageBox.critical(self, "Ошибка", "Не удалось импортировать историю")
+            self.report_transfer(result, "История успешно импортирована", "Не удалось импортировать историю")
+
+        self.run_transfer(
+            "Импорт истории...",
+            lambda progress, cancelled: data_transfer.import_history(
+                self.history, filename, strategy=strategy, progress=progress, cancelled=cancelled
+            ),
+            finished
+        )
 
     def export_history(self):
-        filename, _ = QFileDialog.getSaveFileName(self, "Экспорт истории", "", "JSON Files (*.json);;All Files (*)")
+        import data_transfer
+        filename, _ = QFileDialog.getSaveFileName(self, "Экспорт истории", "", TRANSFER_FILTER)
         if filename:
-            if self.history.export_history(filename):
-                QMessageBox.information(self, "Успех", "История успешно экспортирована")
-            else:
-                QMessageBox.critical(self, "Ошибка", "Не удалось экспортировать историю")
+            self.run_transfer(
+                "Экспорт истории...",
+                lambda progress, cancelled: data_transfer.export_history(
+                    self.history, filename, progress=progress, cancelled=cancelled
+                ),
+                lambda result: self.report_transfer(
+                    result, "История успешно экспортирована", "Не удалось экспортировать историю"
+                )
+            )
 
     def closeEvent(self, event):
-        self.database.save_phrases()
-        self.history.save_history()
+        self.sync_timer.stop()
+        if self.transfer is not None:
+            self.transfer.cancel()
+        if self.transfer is not None or self.loader is not None:
+            QThreadPool.globalInstance().waitForDone()
+        self.engine.shutdown()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        for resource in (self.providers, self.index, self.database, self.history):
+            if resource is not None:
+                resource.close()
         event.accept()
 
 
+def finish_profile(profiler, window):
+    profiler.report()
+    window.close()
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainApplication()
+    profiler = StartupProfiler('--profile-startup' in sys.argv)
+    profiler.record("импорт модулей", STARTED, time.perf_counter())
+    with profiler.phase("создание QApplication"):
+        app = QApplication(sys.argv)
+    with profiler.phase("создание окна"):
+        window = MainApplication(profiler)
+    profiler.watch_paint(window)
     window.show()
+    if profiler.enabled:
+        profiler.completed.connect(lambda: finish_profile(profiler, window))
     sys.exit(app.exec())
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+
+from telemetry import metrics
+from translator_core import RateLimiter, detect_direction
+
+
+def entry_directions(entry):
+    # Частая фраза из истории нужна в обе стороны: оригинал и перевод обратно
+    original, translation = entry.get('original'), entry.get('translation')
+    if not original:
+        return
+    if entry.get('source_lang') and entry.get('target_lang'):
+        source_lang, target_lang = entry['source_lang'], entry['target_lang']
+    else:
+        source_lang, target_lang = detect_direction(original)
+    if source_lang == target_lang:
+        return
+    yield original, target_lang
+    if translation:
+        yield translation, source_lang
+
+
+class Prefetcher:
+    # Фоновая предзагрузка переводов в кэш: частые фразы из истории, недавно
+    # импортированные фразы и, по желанию, текст из буфера обмена. Работает только
+    # пока нет запросов пользователя и со своим, более низким лимитом запросов
+
+    def __init__(self, translator, cache, history=None, database=None, busy=None, rate=0.5,
+                 batch_size=20, top=200, min_count=2, revalidate_after=None, queue_size=1000, interval=2.0):
+        self.translator = translator
+        self.cache = cache
+        self.history = history
+        self.busy = busy
+        self.limiter = RateLimiter(rate)
+        self.batch_size = batch_size
+        self.top = top
+        self.min_count = min_count
+        # Частые фразы переводятся заново раньше, чем запись в общем кэше устареет
+        self.revalidate_after = revalidate_after if revalidate_after is not None else cache.ttl / 2
+        self.queue_size = queue_size
+        self.interval = interval
+        self.queue = OrderedDict()
+        self.frequent = {}
+        self.warmed = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.prefetched = 0
+        self.revalidated = 0
+        self.failed = 0
+        if history is not None:
+            history.subscribe(self.on_history_changed)
+            self.count_history()
+        if database is not None:
+            database.subscribe(self.on_phrases_added)
+
+    def count_history(self):
+        frequent = {}
+        for entry in list(self.history.entries):
+            self.count(entry, frequent)
+        with self.lock:
+            self.frequent = frequent
+
+    def count(self, entry, frequent):
+        for text, target_lang in entry_directions(entry):
+            key = self.cache.key(text, target_lang)
+            if key in frequent:
+                frequent[key][0] += 1
+            else:
+                frequent[key] = [1, text, target_lang]
+
+    def on_history_changed(self, event, entry):
+        if event == 'added':
+            with self.lock:
+                self.count(entry, self.frequent)
+        elif event == 'reset':
+            self.count_history()
+
+    def on_phrases_added(self, rows):
+        # Прямое направление уже есть в базе, предзагружается обратное
+        for source_lang, target_lang, text, translation in rows[-self.queue_size:]:
+            self.enqueue(translation, source_lang)
+
+    def enqueue(self, text, target_lang=None):
+        text = text.strip()
+        if not text:
+            return
+        source_lang, target_lang = detect_direction(text, target_lang)
+        if source_lang == target_lang:
+            return
+        with self.lock:
+            self.queue[(text, target_lang)] = None
+            self.queue.move_to_end((text, target_lang))
+            while len(self.queue) > self.queue_size:
+                self.queue.popitem(last=False)
+
+    def next_batch(self):
+        with self.lock:
+            batch = []
+            while self.queue and len(batch) < self.batch_size:
+                batch.append((*self.queue.popitem(last=False)[0], False))
+            if len(batch) >= self.batch_size:
+                return batch
+
+            now = time.monotonic()
+            frequent = sorted(self.frequent.items(), key=lambda item: -item[1][0])[:self.top]
+            for key, (count, text, target_lang) in frequent:
+                if count < self.min_count or len(batch) >= self.batch_size:
+                    break
+                if key in self.warmed and now - self.warmed[key] < self.revalidate_after:
+                    continue
+                batch.append((text, target_lang, key in self.warmed))
+                self.warmed[key] = now
+            return batch
+
+    def prefetch(self, batch):
+        groups = {}
+        for text, target_lang, revalidate in batch:
+            if revalidate:
+                # Сохраненные пользователем переводы не устаревают
+                if self.cache.database.find_phrase(text, target_lang) is not None:
+                    continue
+            elif self.cache.contains(text, target_lang):
+                continue
+            groups.setdefault(target_lang, {})[text] = revalidate
+
+        for i, (target_lang, texts) in enumerate(groups.items()):
+            if self.stopped.is_set() or (self.busy is not None and self.busy()):
+                # Пользователь ждет перевода: остаток откладывается до следующего цикла
+                for deferred_lang, deferred in list(groups.items())[i:]:
+                    for text in deferred:
+                        self.enqueue(text, deferred_lang)
+                return
+            self.limiter.acquire()
+            with metrics.timer('prefetch.batch'):
+                translations = self.translator.translate_batch(list(texts), target_lang)
+            for (text, revalidate), translation in zip(texts.items(), translations):
+                if translation is None:
+                    self.failed += 1
+                    continue
+                self.cache.put(text, target_lang, translation, prefetched=True)
+                if revalidate:
+                    self.revalidated += 1
+                else:
+                    self.prefetched += 1
+            metrics.count('prefetch.translated', sum(translation is not None for translation in translations))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if self.busy is not None and self.busy():
+                continue
+            batch = self.next_batch()
+            if not batch:
+                continue
+            try:
+                self.prefetch(batch)
+            except Exception as e:
+                print("Ошибка предзагрузки:", e)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='prefetch', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def stats(self):
+        with self.lock:
+            queued = len(self.queue)
+            frequent = sum(count >= self.min_count for count, _, _ in self.frequent.values())
+        return {
+            'queued': queued,
+            'frequent': frequent,
+            'prefetched': self.prefetched,
+            'revalidated': self.revalidated,
+            'failed': self.failed,
+            # Запросы пользователя, которые без предзагрузки ушли бы в сеть
+            'prevented_misses': self.cache.stats()['prefetch_hits'],
+        }
@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from telemetry import metrics
+from translator_core import detect_direction, normalize_text
+from translation_memory import split_segments
+
+
+class ProviderStats:
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.wins = 0
+
+    def record(self, latency, ok):
+        with self.lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(latency)
+                self.consecutive_errors = 0
+            else:
+                self.errors += 1
+                self.consecutive_errors += 1
+
+    def percentile(self, q):
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'wins': self.wins,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+        }
+
+
+class TranslationProvider:
+    name = 'provider'
+    label = ''
+
+    def __init__(self):
+        self.stats = ProviderStats()
+
+    def lookup(self, text, source_lang, target_lang):
+        raise NotImplementedError
+
+    def translate(self, text, target_lang, source_lang=None):
+        source_lang = source_lang or detect_direction(text, target_lang)[0]
+        if source_lang == target_lang:
+            return text
+        start = time.perf_counter()
+        try:
+            translation = self.lookup(text, source_lang, target_lang)
+        except Exception as e:
+            metrics.count(f'providers.{self.name}.errors')
+            print(f"Ошибка поставщика {self.name}:", e)
+            translation = None
+        latency = time.perf_counter() - start
+        self.stats.record(latency, translation is not None)
+        metrics.observe(f'providers.{self.name}', latency)
+        return translation
+
+
+class OnlineProvider(TranslationProvider):
+    name = 'online'
+    label = 'онлайн-сервис'
+
+    def __init__(self, translator, memory=None):
+        super().__init__()
+        self.translator = translator
+        self.memory = memory
+
+    def lookup(self, text, source_lang, target_lang):
+        if self.memory is not None and len(split_segments(text)) > 1:
+            return self.memory.translate(text, target_lang)
+        return self.translator.translate(text, target_lang, source_lang)
+
+    def close(self):
+        self.translator.close()
+
+
+class OfflineProvider(TranslationProvider):
+    name = 'offline'
+    label = 'локальный движок'
+
+    def __init__(self, database, min_coverage=0.6):
+        super().__init__()
+        self.database = database
+        self.min_coverage = min_coverage
+
+    def lookup(self, text, source_lang, target_lang):
+        # Поиск по нормализованному ключу: сохраненная фраза находится независимо от регистра и пробелов
+        key = normalize_text(text)
+        translation = self.database.storage.get_normalized(source_lang, target_lang, key)
+        if translation is not None:
+            return translation
+
+        # Пословный перевод по словарю, если фраза целиком не найдена
+        words = key.split()
+        if len(words) < 2:
+            return None
+        translated = []
+        known = 0
+        for word in words:
+            core = word.strip('.,!?;:"()«»')
+            found = self.database.storage.get_normalized(source_lang, target_lang, core) if core else None
+            if found is not None:
+                known += 1
+                translated.append(word.replace(core, found))
+            else:
+                translated.append(word)
+        if known / len(words) < self.min_coverage:
+            return None
+        return ' '.join(translated)
+
+
+class ProviderRegistry:
+    def __init__(self, hedge_delay=1.0, min_hedge_delay=0.05, max_workers=8):
+        self.providers = []
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.hedged = 0
+
+    def register(self, provider):
+        self.providers.append(provider)
+        return provider
+
+    def get(self, name):
+        for provider in self.providers:
+            if provider.name == name:
+                return provider
+        return None
+
+    def delay_for(self, provider):
+        if provider.stats.consecutive_errors >= 3:
+            return 0
+        p95 = provider.stats.percentile(0.95)
+        return self.hedge_delay if p95 is None else max(self.min_hedge_delay, p95)
+
+    def translate_with_source(self, text, target_lang, source_lang=None):
+        with metrics.timer('providers.translate'):
+            translation, name = self.select(text, target_lang, source_lang)
+        metrics.count('providers.translated' if translation is not None else 'providers.failed')
+        return translation, name
+
+    def select(self, text, target_lang, source_lang=None):
+        if not self.providers:
+            return None, None
+        primary = self.providers[0]
+        futures = {self.pool.submit(primary.translate, text, target_lang, source_lang): primary}
+        done, _ = wait(futures, timeout=self.delay_for(primary))
+
+        for provider in self.providers[1:]:
+            if any(future.result() is not None for future in done):
+                break
+            self.hedged += 1
+            futures[self.pool.submit(provider.translate, text, target_lang, source_lang)] = provider
+            done, _ = wait(futures, timeout=self.delay_for(provider), return_when=FIRST_COMPLETED)
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result() is not None:
+                    provider = futures[future]
+                    provider.stats.wins += 1
+                    return future.result(), provider.name
+        return None, None
+
+    def translate(self, text, target_lang, source_lang=None):
+        return self.translate_with_source(text, target_lang, source_lang)[0]
+
+    def stats(self):
+        return {
+            'hedged': self.hedged,
+            'providers': {provider.name: provider.stats.snapshot() for provider in self.providers},
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        for provider in self.providers:
+            if hasattr(provider, 'close'):
+                provider.close()
@@ -0,0 +1,121 @@
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class Timer:
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+
+class Metrics:
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.collectors = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer(self.window)
+            timer.samples.append(seconds)
+            timer.count += 1
+            timer.total += seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def register(self, name, collector):
+        # collector() возвращает словарь текущих значений, например TranslationCache.stats
+        with self.lock:
+            self.collectors[name] = collector
+
+    def unregister(self, name):
+        with self.lock:
+            self.collectors.pop(name, None)
+
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self.lock:
+            timers = {name: (sorted(timer.samples), timer.count, timer.total) for name, timer in self.timers.items()}
+            counters = dict(self.counters)
+            collectors = list(self.collectors.items())
+
+        gauges = {}
+        for prefix, collector in collectors:
+            for key, value in collector().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{prefix}.{key}"] = value
+        return {
+            'timers': {
+                name: {
+                    'count': count,
+                    'total': total,
+                    **{f"p{round(q * 100)}": percentile(samples, q) for q in QUANTILES},
+                }
+                for name, (samples, count, total) in sorted(timers.items())
+            },
+            'counters': dict(sorted(counters.items())),
+            'gauges': dict(sorted(gauges.items())),
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, timer in snapshot['timers'].items():
+            metric = prometheus_name(name) + '_seconds'
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = timer[f"p{round(q * 100)}"]
+                if value is not None:
+                    lines.append(f'{metric}{{quantile="{q}"}} {value!r}')
+            lines.append(f"{metric}_sum {timer['total']!r}")
+            lines.append(f"{metric}_count {timer['count']}")
+        for name, value in snapshot['counters'].items():
+            metric = prometheus_name(name) + '_total'
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value!r}")
+        for name, value in snapshot['gauges'].items():
+            metric = prometheus_name(name)
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value!r}")
+        return '\n'.join(lines) + '\n'
+
+
+def prometheus_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+metrics = Metrics()
@@ -0,0 +1,256 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from translator_core import TextTranslator, PhraseDatabase, TranslationCache, TranslationHistory, detect_direction
+
+
+class LineReader:
+    def __init__(self, f, offset=0):
+        self.f = f
+        self.f.seek(offset)
+        self.offset = offset
+
+    def __iter__(self):
+        for line in iter(self.f.readline, b''):
+            self.offset = self.f.tell()
+            yield line.decode('utf-8')
+
+
+def read_records(reader, fmt, column, field, header=False):
+    if fmt == 'csv':
+        rows = csv.reader(reader)
+        if header:
+            yield next(rows, []), None
+        for row in rows:
+            if row:
+                # Строка без нужного столбца считается неверной, а не пустым текстом
+                yield (row, row[column]) if column < len(row) else (None, None)
+    elif fmt == 'jsonl':
+        for line in reader:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                text = record.get(field) if isinstance(record, dict) else None
+                # Неразборчивая строка или запись без текстового поля пропускается, run считает такие строки
+                yield (record, text) if isinstance(text, str) else (None, None)
+    else:
+        for line in reader:
+            yield line, line.rstrip('\r\n')
+
+
+def format_record(record, translation, fmt, field):
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerow(record + [translation])
+        return buffer.getvalue()
+    if fmt == 'jsonl':
+        return json.dumps({**record, field + '_translation': translation}, ensure_ascii=False) + '\n'
+    return translation + '\n'
+
+
+class Checkpoint:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        if self.filename and os.path.exists(self.filename):
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'input_offset': 0, 'output_size': 0, 'records': 0}
+
+    def save(self, state):
+        if not self.filename:
+            return
+        temp_name = self.filename + '.tmp'
+        with open(temp_name, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, self.filename)
+
+    def clear(self):
+        if self.filename and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class BatchPipeline:
+    def __init__(self, translator, cache, target_lang, workers=4, chunk_size=200,
+                 save_phrases=False, history=None, report_every=5.0):
+        self.translator = translator
+        self.cache = cache
+        self.target_lang = target_lang
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.save_phrases = save_phrases
+        self.history = history
+        self.report_every = report_every
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.records = 0
+        self.upstream = 0
+        self.failed = 0
+        self.invalid = 0
+        self.unchanged = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def translate_chunk(self, texts):
+        results = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            if not text.strip():
+                results[text] = text
+                continue
+            if detect_direction(text, self.target_lang)[0] == self.target_lang:
+                self.unchanged += 1
+                results[text] = text
+                continue
+            translation = self.cache.get(text, self.target_lang)
+            if translation is None:
+                missing.append(text)
+            else:
+                results[text] = translation
+
+        if missing:
+            groups = [missing[i::self.workers] for i in range(min(self.workers, len(missing)))]
+            futures = [self.pool.submit(self.translator.translate_batch, group, self.target_lang) for group in groups]
+            for group, future in zip(groups, futures):
+                for text, translation in zip(group, future.result()):
+                    if translation is None:
+                        self.failed += 1
+                        continue
+                    self.upstream += 1
+                    results[text] = translation
+                    self.cache.put(text, self.target_lang, translation, persist=self.save_phrases)
+                    if self.history is not None:
+                        self.history.add_entry(text, translation, "online", *detect_direction(text, self.target_lang))
+            if self.history is not None:
+                self.history.save_history()
+        # None — перевод не удался
+        return [results.get(text) for text in texts]
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < self.report_every:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        stats = self.cache.stats()
+        print(f"{self.records} записей, {self.records / elapsed:.1f} зап/с, "
+              f"переведено онлайн: {self.upstream}, уже на нужном языке: {self.unchanged}, ошибок: {self.failed}, "
+              f"пропущено неверных строк: {self.invalid}, "
+              f"попаданий в кэш: {stats['hit_rate']:.0%}", file=sys.stderr)
+
+    def run(self, input_file, output_file, fmt, column=0, field='text', header=True,
+            checkpoint=None, resume=False):
+        checkpoint = Checkpoint(checkpoint)
+        state = checkpoint.load() if resume else {'input_offset': 0, 'output_size': 0, 'records': 0}
+        self.records = state['records']
+
+        with open(input_file, 'rb') as src, open(output_file, 'a+b' if resume else 'wb') as dst:
+            dst.truncate(state['output_size'])
+            dst.seek(state['output_size'])
+            reader = LineReader(src, state['input_offset'])
+            chunk = []
+            header = header and state['input_offset'] == 0
+            completed = True
+            for record, text in read_records(reader, fmt, column, field, header):
+                if record is None:
+                    self.invalid += 1
+                    continue
+                # Смещение конца записи во входном файле: до него можно продолжить после сбоя
+                chunk.append((record, text, reader.offset))
+                if len(chunk) >= self.chunk_size:
+                    completed = self.flush(chunk, dst, checkpoint, fmt, field)
+                    chunk = []
+                    if not completed:
+                        break
+            else:
+                completed = self.flush(chunk, dst, checkpoint, fmt, field)
+
+        self.report(force=True)
+        self.pool.shutdown()
+        if not completed:
+            print(f"Остановлено на записи {self.records + 1}: перевод не удался. "
+                  f"Повторите запуск с --resume, чтобы продолжить с нее", file=sys.stderr)
+            return False
+        checkpoint.clear()
+        return True
+
+    # Записывает порцию; на первой записи без перевода останавливается, не сдвигая контрольную точку за нее
+    def flush(self, chunk, dst, checkpoint, fmt, field):
+        if not chunk:
+            return True
+        translations = iter(self.translate_chunk([text for _, text, _ in chunk if text is not None]))
+        written, offset = 0, None
+        for record, text, end in chunk:
+            translation = 'translation' if text is None else next(translations)
+            if translation is None:
+                break
+            dst.write(format_record(record, translation, fmt, field).encode('utf-8'))
+            written, offset = written + 1, end
+        dst.flush()
+        self.records += written
+        if self.save_phrases:
+            self.cache.database.save_phrases()
+        if offset is not None:
+            checkpoint.save({'input_offset': offset, 'output_size': dst.tell(), 'records': self.records})
+        self.report()
+        return written == len(chunk)
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'txt')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный перевод текстовых файлов без графического интерфейса")
+    parser.add_argument('input', help="входной файл (txt, csv или jsonl)")
+    parser.add_argument('output', help="выходной файл")
+    parser.add_argument('--target', choices=['en', 'ru'], required=True, help="язык перевода")
+    parser.add_argument('--format', choices=['txt', 'csv', 'jsonl'], help="формат входного файла")
+    parser.add_argument('--column', type=int, default=0, help="номер столбца с текстом для csv")
+    parser.add_argument('--no-header', action='store_true', help="в csv нет строки заголовка")
+    parser.add_argument('--field', default='text', help="поле с текстом для jsonl")
+    parser.add_argument('--workers', type=int, default=4, help="число параллельных запросов")
+    parser.add_argument('--chunk-size', type=int, default=200, help="записей в одной порции")
+    parser.add_argument('--rate-limit', type=float, default=5, help="запросов в секунду")
+    parser.add_argument('--checkpoint', help="файл контрольной точки")
+    parser.add_argument('--resume', action='store_true', help="продолжить с контрольной точки")
+    parser.add_argument('--save-phrases', action='store_true', help="сохранять переводы в локальную базу")
+    parser.add_argument('--history', action='store_true', help="записывать переводы в историю")
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.checkpoint:
+        parser.error("--resume требует --checkpoint")
+
+    translator = TextTranslator(rate_limit=args.rate_limit, pool_size=args.workers)
+    database = PhraseDatabase()
+    history = TranslationHistory() if args.history else None
+    pipeline = BatchPipeline(
+        translator, TranslationCache(database), args.target,
+        workers=args.workers, chunk_size=args.chunk_size,
+        save_phrases=args.save_phrases, history=history
+    )
+    try:
+        completed = pipeline.run(args.input, args.output, args.format or detect_format(args.input),
+                                 column=args.column, field=args.field, header=not args.no_header,
+                                 checkpoint=args.checkpoint, resume=args.resume)
+    finally:
+        translator.close()
+        database.close()
+        if history is not None:
+            history.close()
+    return 0 if completed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import difflib
+import re
+import threading
+from collections import OrderedDict
+
+from translator_core import direction_for, normalize_text
+
+SENTENCE_BREAK = re.compile(r'((?<=[.!?…])\s+|\s*\n\s*)')
+TRAILING_PUNCTUATION = '.!?…;:,'
+
+
+def split_segments(text):
+    parts = SENTENCE_BREAK.split(text)
+    segments = []
+    for i in range(0, len(parts), 2):
+        separator = parts[i + 1] if i + 1 < len(parts) else ''
+        segments.append((parts[i], separator))
+    return segments
+
+
+class TranslationMemory:
+    def __init__(self, translator, cache, index=None, near_match=0.92, pending_size=100):
+        self.translator = translator
+        self.cache = cache
+        self.index = index
+        self.near_match = near_match
+        self.pending = OrderedDict()
+        self.pending_size = pending_size
+        self.lock = threading.Lock()
+        self.segments = 0
+        self.reused = 0
+        self.fetched = 0
+
+    def near_lookup(self, segment, target_lang):
+        stripped = segment.rstrip(TRAILING_PUNCTUATION)
+        tail = segment[len(stripped):]
+        if stripped:
+            for candidate in dict.fromkeys([stripped, stripped + '.', stripped + '!', stripped + '?']):
+                if candidate == segment:
+                    continue
+                translation = self.cache.get(candidate, target_lang)
+                if translation is not None:
+                    return translation.rstrip(TRAILING_PUNCTUATION) + tail
+
+        if self.index is None or self.near_match >= 1:
+            return None
+        key = normalize_text(segment)
+        source_lang = direction_for(target_lang)[0]
+        best, best_score = None, self.near_match
+        for text, translation in self.index.phrases_with_prefix(key[:max(3, len(key) // 2)], source_lang, target_lang):
+            score = difflib.SequenceMatcher(None, key, normalize_text(text)).ratio()
+            if score >= best_score:
+                best, best_score = translation, score
+        return best
+
+    def translate(self, text, target_lang):
+        segments = split_segments(text)
+        results = {}
+        missing = []
+        for segment, _ in segments:
+            if not segment.strip() or segment in results or segment in missing:
+                continue
+            translation = self.cache.get(segment, target_lang)
+            if translation is None:
+                translation = self.near_lookup(segment, target_lang)
+            if translation is None:
+                missing.append(segment)
+            else:
+                results[segment] = translation
+
+        fetched = []
+        if missing:
+            for segment, translation in zip(missing, self.translator.translate_batch(missing, target_lang)):
+                if translation is None:
+                    return None
+                results[segment] = translation
+                fetched.append((segment, translation))
+                self.cache.put(segment, target_lang, translation)
+
+        with self.lock:
+            self.segments += len(results)
+            self.fetched += len(fetched)
+            self.reused += len(results) - len(fetched)
+            if fetched:
+                self.pending[(text, target_lang)] = fetched
+                while len(self.pending) > self.pending_size:
+                    self.pending.popitem(last=False)
+        return ''.join(results.get(segment, segment) + separator for segment, separator in segments)
+
+    def commit(self, text, target_lang):
+        with self.lock:
+            fetched = self.pending.pop((text, target_lang), [])
+        for segment, translation in fetched:
+            self.cache.put(segment, target_lang, translation, persist=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'segments': self.segments,
+                'reused': self.reused,
+                'fetched': self.fetched,
+                'reuse_rate': self.reused / self.segments if self.segments else 0.0,
+            }
@@ -0,0 +1,1287 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from telemetry import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass
+
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class InterProcessLock:
+    # Повторно входимая блокировка: между потоками - RLock, между процессами - блокировка файла
+    def __init__(self, filename):
+        self.local = threading.RLock()
+        self.depth = 0
+        self.file = open(filename, 'a+b')
+
+    def acquire(self):
+        self.local.acquire()
+        if self.depth == 0:
+            try:
+                lock_file(self.file)
+            except BaseException:
+                self.local.release()
+                raise
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            unlock_file(self.file)
+        self.local.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        self.file.close()
+
+
+class TextTranslator:
+    URL = "https://translate.googleapis.com/translate_a/single"
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, url=URL, connect_timeout=3.05, read_timeout=5, retries=3,
+                 backoff=0.5, max_backoff=8, rate_limit=5, pool_size=8, batch_chars=1500):
+        self.url = url
+        self.batch_chars = batch_chars
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.limiter = RateLimiter(rate_limit, burst=max(1, int(rate_limit or 1)))
+        self.session = None
+        self.session_lock = threading.Lock()
+
+    def connect(self):
+        # requests загружается около 100 мс, поэтому сессия создается при первом запросе
+        import requests
+        with self.session_lock:
+            if self.session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.session = session
+        return self.session
+
+    def retry_delay(self, attempt, response=None):
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return min(self.max_backoff, int(response.headers['Retry-After']))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def fetch(self, params):
+        import requests
+        session = self.connect()
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            metrics.count('translator.requests')
+            try:
+                with metrics.timer('translator.request'):
+                    response = session.get(self.url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.count('translator.connection_errors')
+                if attempt == self.retries:
+                    raise
+                metrics.count('translator.retries')
+                time.sleep(self.retry_delay(attempt))
+                continue
+            metrics.count('translator.bytes_received', len(response.content))
+            if response.status_code in self.RETRY_STATUSES and attempt < self.retries:
+                metrics.count('translator.retries')
+                time.sleep(self.retry_delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def params(self, text, target_lang, source_lang=None):
+        source_lang = source_lang or direction_for(target_lang)[0]
+        return {
+            'client': 'gtx',
+            'sl': source_lang,
+            'tl': target_lang,
+            'dt': 't',
+            'q': text
+        }
+
+    @staticmethod
+    def join_segments(data):
+        return ''.join(segment[0] for segment in data[0] if segment and segment[0])
+
+    def translate(self, text, target_lang, source_lang=None):
+        try:
+            with metrics.timer('translator.translate'):
+                return self.join_segments(self.fetch(self.params(text, target_lang, source_lang)))
+        except Exception as e:
+            metrics.count('translator.failures')
+            print("Ошибка при переводе:", e)
+            return None
+
+    def pack_batches(self, texts):
+        batch, size = [], 0
+        for text in texts:
+            if batch and size + len(text) + 1 > self.batch_chars:
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text) + 1
+        if batch:
+            yield batch
+
+    def translate_batch(self, texts, target_lang):
+        unique = list(dict.fromkeys(texts))
+        single = [text for text in unique if '\n' in text or len(text) >= self.batch_chars]
+        packable = [text for text in unique if text not in single]
+        results = {}
+
+        for batch in self.pack_batches(packable):
+            try:
+                with metrics.timer('translator.translate_batch'):
+                    lines = self.join_segments(self.fetch(self.params('\n'.join(batch), target_lang))).split('\n')
+            except Exception as e:
+                # Сеть недоступна и после повторов: запросы по одной фразе упрутся в то же самое
+                metrics.count('translator.failures')
+                print("Ошибка при переводе:", e)
+                return [None] * len(texts)
+            if len(lines) == len(batch):
+                results.update(zip(batch, (line.strip() for line in lines)))
+            else:
+                single.extend(batch)
+
+        for text in single:
+            results[text] = self.translate(text, target_lang)
+        return [results[text] for text in texts]
+
+    def close(self):
+        with self.session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+
+CYRILLIC_WORDS = re.compile('[а-яёА-ЯЁ]+')
+LATIN_WORDS = re.compile('[a-zA-Z]+')
+
+
+def script_weight(pattern, text):
+    words = pattern.findall(text)
+    return len(words), sum(map(len, words))
+
+
+def detect_language(text, default=None, sample=400):
+    # Языков всего два и алфавиты у них разные, поэтому достаточно сравнить
+    # число кириллических и латинских слов (а при равенстве - букв) в начале текста
+    text = text[:sample]
+    cyrillic = script_weight(CYRILLIC_WORDS, text)
+    latin = script_weight(LATIN_WORDS, text)
+    if cyrillic == latin:
+        return default
+    return 'ru' if cyrillic > latin else 'en'
+
+
+def guess_source_lang(text):
+    return detect_language(text, default='en')
+
+
+def direction_for(target_lang):
+    return ('ru' if target_lang == 'en' else 'en'), target_lang
+
+
+def detect_direction(text, target_lang=None):
+    source_lang = detect_language(text)
+    if target_lang is None:
+        target_lang = 'ru' if source_lang == 'en' else 'en'
+    return source_lang or direction_for(target_lang)[0], target_lang
+
+
+class JsonPhraseStorage:
+    def __init__(self, filename='phrases.json'):
+        self.filename = filename
+        self.phrases = {}
+        try:
+            if os.path.exists(filename):
+                with open(filename, 'r', encoding='utf-8') as f:
+                    for text, translation in json.load(f).items():
+                        source_lang = guess_source_lang(text)
+                        target_lang = 'en' if source_lang == 'ru' else 'ru'
+                        self.phrases[(source_lang, target_lang, text)] = translation
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.phrases = {}
+
+    def get(self, source_lang, target_lang, text):
+        return self.phrases.get((source_lang, target_lang, text))
+
+    def find(self, text):
+        for (_, _, key), translation in self.phrases.items():
+            if key == text:
+                return translation
+        return None
+
+    def get_normalized(self, source_lang, target_lang, norm):
+        for (source, target, text), translation in self.phrases.items():
+            if (source, target) == (source_lang, target_lang) and normalize_text(text) == norm:
+                return translation
+        return None
+
+    def put(self, source_lang, target_lang, text, translation):
+        self.phrases[(source_lang, target_lang, text)] = translation
+
+    def put_many(self, rows):
+        for source_lang, target_lang, text, translation in rows:
+            self.phrases[(source_lang, target_lang, text)] = translation
+
+    def merge_many(self, rows, strategy='overwrite'):
+        applied = 0
+        for source_lang, target_lang, text, translation, _ in rows:
+            key = (source_lang, target_lang, text)
+            if strategy == 'skip' and key in self.phrases:
+                continue
+            self.phrases[key] = translation
+            applied += 1
+        return applied
+
+    def items(self):
+        for (source_lang, target_lang, text), translation in self.phrases.items():
+            yield source_lang, target_lang, text, translation
+
+    def records(self):
+        for row in self.items():
+            yield (*row, 0)
+
+    def count(self):
+        return len(self.phrases)
+
+    def flush(self):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump({text: translation for _, _, text, translation in self.items()},
+                      f, ensure_ascii=False, indent=4)
+
+    def get_shared(self, source_lang, target_lang, text):
+        return None
+
+    def put_shared(self, source_lang, target_lang, text, translation, ttl):
+        pass
+
+    def changed_phrases(self):
+        return []
+
+    def close(self):
+        self.flush()
+
+
+class SqlitePhraseStorage:
+    # Страницы базы отображаются в память и делятся между всеми экземплярами через кэш ОС
+    MMAP_SIZE = 1 << 30
+
+    def __init__(self, filename='phrases.db'):
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size={self.MMAP_SIZE}")
+        self.conn.create_function('normalize_text', 1, normalize_text, deterministic=True)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS phrases ("
+            " source_lang TEXT NOT NULL,"
+            " target_lang TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " PRIMARY KEY (source_lang, target_lang, text)"
+            ") WITHOUT ROWID"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(phrases)")]
+        if 'updated' not in columns:
+            self.conn.execute("ALTER TABLE phrases ADD COLUMN updated REAL NOT NULL DEFAULT 0")
+        # Нормализованный текст - ключ поиска без учета регистра и пробелов; text остается как ввел пользователь
+        if 'norm' not in columns:
+            self.conn.execute("ALTER TABLE phrases ADD COLUMN norm TEXT")
+            self.conn.execute("UPDATE phrases SET norm = normalize_text(text)")
+        # Счетчик изменений: каждая записанная строка получает следующий номер
+        if 'seq' not in columns:
+            self.conn.execute("ALTER TABLE phrases ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS phrases_text ON phrases (text)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS phrases_norm ON phrases (source_lang, target_lang, norm)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS phrases_seq ON phrases (seq)")
+        # Несохраненные онлайн-переводы, общие для всех экземпляров приложения
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            " source_lang TEXT NOT NULL,"
+            " target_lang TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " expires REAL NOT NULL,"
+            " PRIMARY KEY (source_lang, target_lang, text)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.commit()
+        self.shared_writes = 0
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.seen_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM phrases").fetchone()[0]
+
+    def get(self, source_lang, target_lang, text):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT translation FROM phrases WHERE source_lang = ? AND target_lang = ? AND text = ?",
+                (source_lang, target_lang, text)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find(self, text):
+        with self.lock:
+            row = self.conn.execute("SELECT translation FROM phrases WHERE text = ? LIMIT 1", (text,)).fetchone()
+        return row[0] if row else None
+
+    def get_normalized(self, source_lang, target_lang, norm):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT translation FROM phrases INDEXED BY phrases_norm "
+                "WHERE source_lang = ? AND target_lang = ? AND norm = ? "
+                "ORDER BY updated DESC LIMIT 1",
+                (source_lang, target_lang, norm)
+            ).fetchone()
+        return row[0] if row else None
+
+    UPSERT = (
+        "INSERT INTO phrases (source_lang, target_lang, text, translation, updated, norm, seq) "
+        "VALUES (?1, ?2, ?3, ?4, ?5, normalize_text(?3), (SELECT COALESCE(MAX(seq), 0) + 1 FROM phrases)) "
+        "ON CONFLICT (source_lang, target_lang, text) DO "
+    )
+    MERGE_ACTIONS = {
+        'overwrite': "UPDATE SET translation = excluded.translation, updated = excluded.updated, seq = excluded.seq",
+        'skip': "NOTHING",
+        'newest': "UPDATE SET translation = excluded.translation, updated = excluded.updated, seq = excluded.seq "
+                  "WHERE excluded.updated > phrases.updated",
+    }
+
+    def put(self, source_lang, target_lang, text, translation):
+        with self.lock:
+            self.conn.execute(
+                self.UPSERT + self.MERGE_ACTIONS['overwrite'],
+                (source_lang, target_lang, text, translation, time.time())
+            )
+
+    def put_many(self, rows):
+        now = time.time()
+        self.merge_many(((*row, now) for row in rows))
+
+    def merge_many(self, rows, strategy='overwrite'):
+        with self.lock, self.conn:
+            return self.conn.executemany(self.UPSERT + self.MERGE_ACTIONS[strategy], rows).rowcount
+
+    def items(self):
+        with self.lock:
+            cursor = self.conn.execute("SELECT source_lang, target_lang, text, translation FROM phrases")
+            rows = cursor.fetchmany(1000)
+        while rows:
+            yield from rows
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+
+    def records(self):
+        with self.lock:
+            cursor = self.conn.execute("SELECT source_lang, target_lang, text, translation, updated FROM phrases")
+            rows = cursor.fetchmany(1000)
+        while rows:
+            yield from rows
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM phrases").fetchone()[0]
+
+    def get_shared(self, source_lang, target_lang, text):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT translation FROM shared_cache "
+                "WHERE source_lang = ? AND target_lang = ? AND text = ? AND expires > ?",
+                (source_lang, target_lang, text, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_shared(self, source_lang, target_lang, text, translation, ttl):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shared_cache VALUES (?, ?, ?, ?, ?)",
+                (source_lang, target_lang, text, translation, now + ttl)
+            )
+            self.shared_writes += 1
+            if self.shared_writes % 1000 == 0:
+                self.conn.execute("DELETE FROM shared_cache WHERE expires <= ?", (now,))
+
+    def changed_phrases(self):
+        # data_version меняется только после фиксации изменений другим соединением;
+        # записи shared_cache его тоже меняют, поэтому измененные фразы ищутся по seq
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return []
+            self.data_version = version
+            rows = self.conn.execute(
+                "SELECT norm, source_lang, target_lang, seq FROM phrases WHERE seq > ?", (self.seen_seq,)
+            ).fetchall()
+            if rows:
+                self.seen_seq = max(row[3] for row in rows)
+        return [row[:3] for row in rows]
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def row_bytes(row):
+    # Приблизительный объем записи: текст и перевод в UTF-8
+    return len(row[2].encode('utf-8')) + len(row[3].encode('utf-8'))
+
+
+class PhraseDatabase:
+    def __init__(self, storage=None, legacy_file='phrases.json'):
+        self.storage = storage if storage is not None else SqlitePhraseStorage()
+        self.legacy_file = legacy_file
+        self.listeners = []
+        self.load_phrases()
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, rows):
+        for listener in self.listeners:
+            listener(rows)
+
+    def load_phrases(self):
+        if isinstance(self.storage, JsonPhraseStorage) or not os.path.exists(self.legacy_file):
+            return
+        self.storage.put_many(JsonPhraseStorage(self.legacy_file).items())
+        os.replace(self.legacy_file, self.legacy_file + '.bak')
+
+    def save_phrases(self):
+        with metrics.timer('phrases.flush'):
+            self.storage.flush()
+
+    def get_phrase(self, text, target_lang=None):
+        with metrics.timer('phrases.get'):
+            if target_lang is None:
+                return self.storage.find(text)
+            return self.storage.get(*direction_for(target_lang), text)
+
+    def find_phrase(self, text, target_lang):
+        # Сначала точное совпадение, затем то же с точностью до регистра и пробелов
+        translation = self.get_phrase(text, target_lang)
+        if translation is None:
+            with metrics.timer('phrases.get'):
+                translation = self.storage.get_normalized(*direction_for(target_lang), normalize_text(text))
+        return translation
+
+    def add_phrase(self, text, translation, target_lang=None):
+        if target_lang is None:
+            source_lang = guess_source_lang(text)
+            target_lang = 'en' if source_lang == 'ru' else 'ru'
+        row = (*direction_for(target_lang), text, translation)
+        with metrics.timer('phrases.put'):
+            self.storage.put(*row)
+        metrics.count('phrases.bytes_written', row_bytes(row))
+        self.notify([row])
+
+    def get_shared(self, text, target_lang):
+        with metrics.timer('phrases.get_shared'):
+            return self.storage.get_shared(*direction_for(target_lang), text)
+
+    def share(self, text, translation, target_lang, ttl):
+        with metrics.timer('phrases.share'):
+            self.storage.put_shared(*direction_for(target_lang), text, translation, ttl)
+
+    def changed_phrases(self):
+        return self.storage.changed_phrases()
+
+    def put_rows(self, rows):
+        with metrics.timer('phrases.put_many'):
+            self.storage.put_many(rows)
+        metrics.count('phrases.bytes_written', sum(row_bytes(row) for row in rows))
+        self.notify(rows)
+
+    def translate_missing(self, texts, translator, target_lang):
+        results = {text: self.get_phrase(text, target_lang) for text in dict.fromkeys(texts)}
+        missing = [text for text, translation in results.items() if translation is None]
+        if missing:
+            translations = translator.translate_batch(missing, target_lang)
+            rows = []
+            for text, translation in zip(missing, translations):
+                if translation:
+                    results[text] = translation
+                    rows.append((*direction_for(target_lang), text, translation))
+            self.put_rows(rows)
+            self.save_phrases()
+        return [results[text] for text in texts]
+
+    def merge_rows(self, rows, strategy='overwrite'):
+        with metrics.timer('phrases.put_many'):
+            applied = self.storage.merge_many(rows, strategy)
+        metrics.count('phrases.bytes_written', sum(row_bytes(row) for row in rows))
+        if strategy == 'overwrite':
+            self.notify([row[:4] for row in rows])
+        elif applied:
+            current = ((row[0], row[1], row[2], self.storage.get(*row[:3])) for row in rows)
+            self.notify([row for row in current if row[3] is not None])
+        return applied
+
+    def import_phrases(self, filename, strategy='overwrite'):
+        from data_transfer import import_phrases
+        try:
+            import_phrases(self, filename, strategy=strategy)
+            return True
+        except Exception:
+            return False
+
+    def export_phrases(self, filename):
+        from data_transfer import export_phrases
+        try:
+            export_phrases(self, filename)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        self.storage.close()
+
+
+def normalize_text(text):
+    return ' '.join(text.split()).casefold()
+
+
+class TranslationCache:
+    def __init__(self, database, max_size=10000, ttl=3600):
+        self.database = database
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.prefetch_hits = 0
+
+    @staticmethod
+    def key(text, target_lang):
+        return (normalize_text(text), *direction_for(target_lang))
+
+    def remember(self, key, translation, prefetched=False):
+        # prefetched: запись положена фоновой предзагрузкой и еще не запрашивалась
+        self.entries[key] = (translation, time.monotonic() + self.ttl, prefetched)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, text, target_lang):
+        with metrics.timer('cache.lookup'):
+            return self.find(text, target_lang)
+
+    def find(self, text, target_lang):
+        key = self.key(text, target_lang)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                if cached[1] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.memory_hits += 1
+                    if cached[2]:
+                        self.prefetch_hits += 1
+                        self.entries[key] = cached[:2] + (False,)
+                    return cached[0], 'memory'
+                del self.entries[key]
+                self.expirations += 1
+
+        source = 'local'
+        translation = self.database.find_phrase(text, target_lang)
+        if translation is None:
+            source = 'shared'
+            translation = self.database.get_shared(key[0], target_lang)
+        with self.lock:
+            if translation is None:
+                self.misses += 1
+                return None, None
+            if source == 'shared':
+                self.shared_hits += 1
+            else:
+                self.store_hits += 1
+            self.remember(key, translation)
+        return translation, source
+
+    def get(self, text, target_lang):
+        return self.lookup(text, target_lang)[0]
+
+    def contains(self, text, target_lang):
+        # Проверка без учета в статистике и без изменения порядка вытеснения
+        key = self.key(text, target_lang)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None and cached[1] > time.monotonic():
+                return True
+        return (self.database.find_phrase(text, target_lang) is not None
+                or self.database.get_shared(key[0], target_lang) is not None)
+
+    def put(self, text, target_lang, translation, persist=False, prefetched=False):
+        key = self.key(text, target_lang)
+        with self.lock:
+            self.remember(key, translation, prefetched)
+        if persist:
+            # В базу пользователя фраза попадает как есть; нормализованная форма — только ключ кэша
+            self.database.add_phrase(text, translation, target_lang)
+            self.database.save_phrases()
+        else:
+            self.database.share(key[0], translation, target_lang, self.ttl)
+
+    def refresh(self):
+        # Другой экземпляр изменил фразы: вытесняются только записи с теми же ключами
+        changed = self.database.changed_phrases()
+        if not changed:
+            return False
+        with self.lock:
+            for key in changed:
+                self.entries.pop(key, None)
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.memory_hits + self.store_hits + self.shared_hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'memory_hits': self.memory_hits,
+                'store_hits': self.store_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'prefetch_hits': self.prefetch_hits,
+                'hit_rate': (self.memory_hits + self.store_hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+def read_lines_backwards(f, end, block_size=65536):
+    pos = end
+    rest = b''
+    while pos > 0:
+        size = min(block_size, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size) + rest
+        lines = chunk.split(b'\n')
+        rest = lines.pop(0)
+        line_end = pos + len(chunk)
+        for line in reversed(lines):
+            line_start = line_end - len(line)
+            if line.strip():
+                yield line_start, line
+            line_end = line_start - 1
+    if rest.strip():
+        yield 0, rest
+
+
+def decode_entry(line):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+class TranslationHistory:
+    def __init__(self, filename='history.jsonl', max_entries=None, max_age_days=None,
+                 tail_size=500, fsync_every=20, fsync_interval=2.0, compact_every=1000,
+                 legacy_file='history.json'):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.tail_size = tail_size
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.legacy_file = legacy_file
+        # Журнал может быть открыт несколькими экземплярами приложения и утилитами
+        self.lock = InterProcessLock(filename + '.lock')
+        self.entries = []
+        self.loaded_offset = 0
+        self.end_offset = 0
+        self.generation = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.appended = 0
+        self.compactor = None
+        self.file = None
+        self.listeners = []
+        self.load_history()
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, event, entry=None):
+        for listener in self.listeners:
+            listener(event, entry)
+
+    def load_history(self):
+        with self.lock:
+            if os.path.exists(self.legacy_file):
+                self.migrate_legacy()
+            self.file = open(self.filename, 'ab')
+            self.loaded_offset = self.end_offset = self.size()
+            self.entries = []
+            self.load_more(self.tail_size)
+        self.schedule_compaction()
+
+    def migrate_legacy(self):
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            legacy = []
+        with open(self.filename, 'ab') as f:
+            for entry in reversed(legacy):
+                f.write(self.encode(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.legacy_file, self.legacy_file + '.bak')
+
+    @staticmethod
+    def encode(entry):
+        return (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def size(self):
+        with self.lock:
+            self.file.flush()
+            return os.fstat(self.file.fileno()).st_size
+
+    def replaced(self):
+        # Другой экземпляр очистил, сжал или заменил журнал
+        try:
+            return os.stat(self.filename).st_ino != os.fstat(self.file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def ingest_external(self, max_bytes=1 << 20):
+        size = self.size()
+        if size <= self.end_offset:
+            return True
+        if size - self.end_offset > max_bytes:
+            return False
+        with open(self.filename, 'rb') as f:
+            f.seek(self.end_offset)
+            lines = f.read(size - self.end_offset).split(b'\n')
+        self.end_offset = size
+        for line in lines:
+            entry = decode_entry(line) if line.strip() else None
+            if entry is not None:
+                self.entries.append(entry)
+                self.notify('added', entry)
+        return True
+
+    def refresh(self):
+        # Подхватывает записи, добавленные другими экземплярами приложения
+        with self.lock:
+            if self.replaced():
+                self.file.close()
+                self.file = open(self.filename, 'ab')
+            elif self.ingest_external():
+                return
+        self.reload()
+
+    def can_load_more(self):
+        return self.loaded_offset > 0
+
+    def load_more(self, count):
+        with self.lock:
+            if self.replaced():
+                return 0
+            older = []
+            with open(self.filename, 'rb') as f:
+                for start, line in read_lines_backwards(f, self.loaded_offset):
+                    entry = decode_entry(line)
+                    self.loaded_offset = start
+                    if entry is not None:
+                        older.append(entry)
+                        if len(older) >= count:
+                            break
+                else:
+                    self.loaded_offset = 0
+            older.reverse()
+            self.entries[:0] = older
+            self.generation += 1
+            return len(older)
+
+    def iter_entries(self):
+        with self.lock:
+            end = self.size()
+        with open(self.filename, 'rb') as f:
+            for _, line in read_lines_backwards(f, end):
+                entry = decode_entry(line)
+                if entry is not None:
+                    yield entry
+
+    def save_history(self):
+        with self.lock:
+            self.file.flush()
+            if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self.sync()
+
+    def sync(self):
+        with self.lock, metrics.timer('history.fsync'):
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+            self.last_sync = time.monotonic()
+
+    def append(self, entry):
+        with self.lock, metrics.timer('history.append'):
+            if self.replaced() or not self.ingest_external():
+                self.refresh()
+            line = self.encode(entry)
+            self.file.write(line)
+            self.file.flush()
+            metrics.count('history.bytes_written', len(line))
+            self.end_offset = self.size()
+            self.entries.append(entry)
+            self.unsynced += 1
+            self.appended += 1
+            self.notify('added', entry)
+        if self.appended >= self.compact_every:
+            self.schedule_compaction()
+
+    def add_entry(self, original, translation, source, source_lang=None, target_lang=None):
+        entry = {
+            'timestamp': datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+            'time': time.time(),
+            'original': original,
+            'translation': translation,
+            'source': source
+        }
+        if source_lang and target_lang:
+            entry['source_lang'] = source_lang
+            entry['target_lang'] = target_lang
+        self.append(entry)
+        return entry
+
+    def clear(self):
+        # Файл заменяется, а не обрезается, чтобы другие экземпляры заметили очистку
+        empty_name = self.filename + '.clear'
+        with self.lock:
+            open(empty_name, 'wb').close()
+            self.replace_with(empty_name)
+            self.sync()
+            self.entries = []
+        self.notify('reset')
+
+    def schedule_compaction(self):
+        if self.max_entries is None and self.max_age_days is None:
+            return
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+        self.appended = 0
+        self.compactor = threading.Thread(target=self.compact, daemon=True)
+        self.compactor.start()
+
+    def keep(self, entry, cutoff):
+        return cutoff is None or entry.get('time', cutoff) >= cutoff
+
+    def compact(self):
+        with self.lock:
+            self.sync()
+            end = self.size()
+            if self.end_offset != end:
+                # Есть еще не прочитанные записи других экземпляров, сжатие подождет
+                return False
+            loaded_offset = self.loaded_offset
+            generation = self.generation
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days is not None else None
+        temp_name = self.filename + '.compact'
+
+        with open(self.filename, 'rb') as src:
+            total = sum(1 for line in iter(src.readline, b'') if src.tell() <= end and line.strip())
+            skip = total - self.max_entries if self.max_entries is not None else 0
+            src.seek(0)
+            new_offset = None
+            with open(temp_name, 'wb') as dst:
+                index = 0
+                while src.tell() < end:
+                    start = src.tell()
+                    line = src.readline()
+                    if new_offset is None and start >= loaded_offset:
+                        new_offset = dst.tell()
+                    if not line.strip():
+                        continue
+                    index += 1
+                    if index <= skip:
+                        continue
+                    entry = decode_entry(line) if cutoff is not None else True
+                    if entry is not None and (entry is True or self.keep(entry, cutoff)):
+                        dst.write(line if line.endswith(b'\n') else line + b'\n')
+                if new_offset is None:
+                    new_offset = dst.tell()
+
+                with self.lock:
+                    if self.generation != generation or self.replaced() or self.end_offset < end:
+                        dst.close()
+                        os.remove(temp_name)
+                        return False
+                    self.file.flush()
+                    src.seek(end)
+                    tail_offset = dst.tell()
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                    self.file.close()
+                    os.replace(temp_name, self.filename)
+                    self.file = open(self.filename, 'ab')
+                    self.loaded_offset = new_offset
+                    self.end_offset = tail_offset + self.end_offset - end
+        self.notify('compacted')
+        return True
+
+    def append_many(self, entries):
+        with self.lock:
+            if self.replaced():
+                self.file.close()
+                self.file = open(self.filename, 'ab')
+            caught_up = self.size() == self.end_offset
+            written = 0
+            for entry in entries:
+                line = self.encode(entry)
+                self.file.write(line)
+                written += len(line)
+            self.file.flush()
+            metrics.count('history.bytes_written', written)
+            if caught_up:
+                self.end_offset = self.size()
+            self.unsynced += len(entries)
+            self.appended += len(entries)
+
+    def replace_with(self, filename):
+        with self.lock:
+            self.file.close()
+            os.replace(filename, self.filename)
+            self.file = open(self.filename, 'ab')
+            self.loaded_offset = self.end_offset = 0
+            self.generation += 1
+
+    def reload(self):
+        with self.lock:
+            self.sync()
+            self.loaded_offset = self.end_offset = self.size()
+            self.entries = []
+            self.load_more(self.tail_size)
+        self.notify('reset')
+        self.schedule_compaction()
+
+    def import_history(self, filename, strategy='skip'):
+        from data_transfer import import_history
+        try:
+            import_history(self, filename, strategy=strategy)
+            return True
+        except Exception:
+            return False
+        finally:
+            self.reload()
+
+    def export_history(self, filename):
+        from data_transfer import export_history
+        try:
+            export_history(self, filename)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            self.sync()
+            self.file.close()
+        self.lock.close()
+
+
+SUGGEST_ALPHABET = 'abcdefghijklmnopqrstuvwxyzабвгдеёжзийклмнопрстуфхцчшщъыьэюя '
+
+
+def fts_phrase(query):
+    return '"' + query.replace('"', '""') + '"'
+
+
+def like_pattern(query):
+    return query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SearchIndex:
+    def __init__(self, database, history, filename='search.db', batch_size=1000):
+        self.database = database
+        self.history = history
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.ready = False
+        self.closing = False
+        self.building = True
+        self.generation = 0
+        self.conn = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size={SqlitePhraseStorage.MMAP_SIZE}")
+        self.conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                original, translation, timestamp UNINDEXED, source UNINDEXED, tokenize='trigram'
+            );
+            CREATE TABLE IF NOT EXISTS phrase_keys (
+                source_lang TEXT, target_lang TEXT, text TEXT, translation TEXT, norm TEXT,
+                PRIMARY KEY (source_lang, target_lang, text)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS phrase_keys_norm ON phrase_keys (norm);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+        """)
+        self.conn.commit()
+        database.subscribe(self.on_phrases_added)
+        history.subscribe(self.on_history_changed)
+        self.builder = threading.Thread(target=self.catch_up, daemon=True)
+        self.builder.start()
+
+    def meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def index_phrases(self, rows):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO phrase_keys VALUES (?, ?, ?, ?, ?)",
+                [(*row, normalize_text(row[2])) for row in rows]
+            )
+
+    def index_history(self, entries):
+        self.conn.executemany(
+            "INSERT INTO history_fts VALUES (?, ?, ?, ?)",
+            [(e.get('original', ''), e.get('translation', ''), e.get('timestamp', ''), e.get('source', ''))
+             for e in entries]
+        )
+
+    def catch_up(self):
+        with self.lock:
+            phrases_indexed = self.meta('phrases_indexed')
+        if not phrases_indexed:
+            batch = []
+            for row in self.database.storage.items():
+                if self.closing:
+                    return
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.index_phrases(batch)
+                    batch = []
+            self.index_phrases(batch)
+            with self.lock, self.conn:
+                self.set_meta('phrases_indexed', 1)
+        self.catch_up_history()
+
+    @staticmethod
+    def history_identity(f):
+        stat = os.fstat(f.fileno())
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def index_history_step(self):
+        # Смещение и идентификатор журнала хранятся в общей search.db, поэтому
+        # несколько экземпляров продолжают индексацию друг за другом без повторов
+        with self.history.lock:
+            self.history.size()
+            with open(self.history.filename, 'rb') as f, self.lock, self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                end = os.fstat(f.fileno()).st_size
+                identity = self.history_identity(f)
+                offset = self.meta('history_offset', 0)
+                if self.meta('history_file') != identity or offset > end:
+                    self.conn.execute("DELETE FROM history_fts")
+                    self.set_meta('history_file', identity)
+                    offset = 0
+                f.seek(offset)
+                batch = []
+                while offset < end and len(batch) < self.batch_size:
+                    line = f.readline()
+                    offset = f.tell()
+                    entry = decode_entry(line)
+                    if entry is not None:
+                        batch.append(entry)
+                self.index_history(batch)
+                self.set_meta('history_offset', offset)
+        return offset >= end
+
+    def catch_up_history(self):
+        while not self.closing:
+            generation = self.generation
+            done = self.index_history_step()
+            with self.lock:
+                if done and generation == self.generation:
+                    self.ready = True
+                    self.building = False
+                    return
+
+    def on_phrases_added(self, rows):
+        self.index_phrases(rows)
+
+    def on_history_changed(self, event, entry):
+        if event == 'added' and self.ready:
+            self.index_history_step()
+        elif event in ('reset', 'compacted'):
+            with self.lock:
+                self.ready = False
+                self.generation += 1
+                if not self.building:
+                    self.building = True
+                    self.builder = threading.Thread(target=self.catch_up_history, daemon=True)
+                    self.builder.start()
+
+    def search_history(self, query, limit=500):
+        query = query.strip()
+        if not query:
+            return []
+        with self.lock:
+            if len(query) >= 3:
+                rows = self.conn.execute(
+                    "SELECT original, translation, timestamp, source FROM history_fts "
+                    "WHERE history_fts MATCH ? ORDER BY rowid DESC LIMIT ?",
+                    (fts_phrase(query), limit)
+                ).fetchall()
+            else:
+                pattern = '%' + like_pattern(query) + '%'
+                rows = self.conn.execute(
+                    "SELECT original, translation, timestamp, source FROM history_fts "
+                    "WHERE original LIKE ? ESCAPE '\\' OR translation LIKE ? ESCAPE '\\' "
+                    "ORDER BY rowid DESC LIMIT ?",
+                    (pattern, pattern, limit)
+                ).fetchall()
+        return [{'original': original, 'translation': translation, 'timestamp': timestamp, 'source': source}
+                for original, translation, timestamp, source in rows]
+
+    def prefix_matches(self, prefix, limit):
+        return self.conn.execute(
+            "SELECT text, translation, source_lang, target_lang FROM phrase_keys "
+            "WHERE norm >= ? AND norm < ? ORDER BY norm LIMIT ?",
+            (prefix, prefix + '\uffff', limit)
+        ).fetchall()
+
+    def phrases_with_prefix(self, prefix, source_lang, target_lang, limit=20):
+        # Один запрос по индексу norm, без вариантов с опечатками
+        with self.lock:
+            return self.conn.execute(
+                "SELECT text, translation FROM phrase_keys "
+                "WHERE norm >= ? AND norm < ? AND source_lang = ? AND target_lang = ? ORDER BY norm LIMIT ?",
+                (prefix, prefix + '\uffff', source_lang, target_lang, limit)
+            ).fetchall()
+
+    @staticmethod
+    def one_edit_variants(word):
+        alphabet = set(word) | set(SUGGEST_ALPHABET)
+        variants = set()
+        for i in range(len(word) + 1):
+            head, tail = word[:i], word[i:]
+            if tail:
+                variants.add(head + tail[1:])
+            if len(tail) > 1:
+                variants.add(head + tail[1] + tail[0] + tail[2:])
+            for ch in alphabet:
+                variants.add(head + ch + tail)
+                if tail:
+                    variants.add(head + ch + tail[1:])
+        variants.discard(word)
+        return variants
+
+    def suggest(self, text, limit=8):
+        query = normalize_text(text)
+        if len(query) < 2:
+            return []
+        with self.lock:
+            found = self.prefix_matches(query, limit)
+            if len(found) < limit and len(query) >= 3:
+                seen = set(found)
+                for variant in sorted(self.one_edit_variants(query)):
+                    for row in self.prefix_matches(variant, limit - len(found)):
+                        if row not in seen:
+                            seen.add(row)
+                            found.append(row)
+                    if len(found) >= limit:
+                        break
+        return found
+
+    def close(self):
+        self.closing = True
+        self.builder.join()
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()